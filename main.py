@@ -150,15 +150,12 @@ class Guizero:
         self.train_box_view.show()
 
     def view_cmd(self):
-        self.training.load_model(self.listbox.value, self.render_on.value)
+        # the map is drawn, it needs its sprites whatever the training render option
+        self.training.load_model(self.listbox.value, True)
         self.training._env_width = self._env_width
         self.training._env_height = self._env_height
         self.training._multiplier = self._multiplier
-        self._environment._rooms = self.training._rooms
-        self._environment._agent = self.training._agent
-        self._environment._objective = self.training._objective
-        self._environment._floor = self.training._floor
-        self._environment._screen = self.training._screen
+        # the environment shares the world the map was just loaded into
         self._environment._env_width = self._env_width
         self._environment._env_height = self._env_height
         self._environment._multiplier = self._multiplier
@@ -1,19 +1,33 @@
 import tensorflow as tf
 import numpy as np
-from collections import deque
 import random
-import pygame
 from utils.utils import ExitException
+from utils.inference import NumpyModel
+from utils.replay import ReplayBuffer, PrioritizedReplayBuffer
 
 EPOCHS = 1
+MEMORY_SIZE = 100000
+# nonzero reward transitions replayed in full at the next replay, 0 to sample the memory uniformly
+REWARD_PRIORITY_SIZE = 200
+# sample the memory in proportion to the TD errors instead, with importance sampling weights
+PRIORITIZED_REPLAY = False
+PRIORITY_ALPHA = 0.6
+PRIORITY_BETA = 0.4
+# replays over which the importance sampling correction grows to full, one replay per episode
+PRIORITY_BETA_STEPS = 5000
 
 
 class SLAMAgent:
-    def __init__(self, state_size, action_size):
+    def __init__(self, state_size, action_size, codec=None, prioritized=PRIORITIZED_REPLAY):
+        # codec: ObservationCodec storing the remembered observations compactly, None to keep them as float64
         self.state_size = state_size
         self.action_size = action_size
-        self.memory = deque(maxlen=100000)
-        self.temp_memory = deque(maxlen=200)
+        self.prioritized = prioritized
+        if prioritized:
+            self.memory = PrioritizedReplayBuffer(MEMORY_SIZE, (state_size, 3), PRIORITY_ALPHA, PRIORITY_BETA,
+                                                  PRIORITY_BETA_STEPS, codec=codec)
+        else:
+            self.memory = ReplayBuffer(MEMORY_SIZE, (state_size, 3), REWARD_PRIORITY_SIZE, codec=codec)
         self.gamma = 1
         self.epsilon = 1.0
         self.epsilon_min = 0.025
@@ -22,6 +36,8 @@ class SLAMAgent:
         self.learning_rate_decay = 0.01
         self.random_actions = [0, 1, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2]
         self.model = self._build_model()
+        # copy of the model for act, synced after every change of the weights
+        self.inference = NumpyModel(self.model)
         np.set_printoptions(threshold=np.inf, linewidth=np.inf)
 
     def _build_model(self):
@@ -41,26 +57,47 @@ class SLAMAgent:
         return model
 
     def remember(self, state, action, reward, next_state, terminal):
-        if reward == 0:
-            self.memory.append((state, action, reward, next_state, terminal))
-        else:
-            self.temp_memory.append((state, action, reward, next_state, terminal))
-
-    def act(self, state):
-        current_min_distance = 1
-        for i in range(len(state[0])):
-            if state[0][i][1] < current_min_distance and not state[0][i][2]:
-                current_min_distance = state[0][i][1]
-        if current_min_distance < 0.049:
+        self.memory.add(state, action, reward, next_state, terminal, priority=reward != 0)
+
+    def act(self, state, clearance=None):
+        # clearance: distance to the closest obstacle in sensor ranges, e.g. read from a DistanceField, instead of
+        # the closest ray not hitting the objective
+        if clearance is None:
+            clearance = np.where(state[0, :, 2] != 0, 1, state[0, :, 1]).min(initial=1)
+        if clearance < 0.049:
             out = random.randrange(self.action_size - 1)
             return out, False
         if np.random.rand() <= self.epsilon:
             if state[0][18][2] or state[0][19][2] or state[0][20][2]:
                 return 2, False
             return self.random_actions[random.randrange(len(self.random_actions) - 1)], True
-        act_values = self.model.predict(state)
+        act_values = self.inference.predict(state)
         return np.argmax(act_values[0]), False
 
+    def act_many(self, states, clearances=None):
+        """act for a batch of (N, state_size, 3) states, with a single model call for the greedy ones.
+        Returns the N actions and whether each was random."""
+        actions = np.empty(len(states), dtype=np.int64)
+        was_random = np.zeros(len(states), dtype=bool)
+        if clearances is None:
+            # closest ray not hitting the objective
+            clearances = np.where(states[:, :, 2] != 0, 1, states[:, :, 1]).min(axis=1, initial=1)
+        too_close = np.asarray(clearances) < 0.049
+        exploring = ~too_close & (np.random.rand(len(states)) <= self.epsilon)
+        objective_ahead = (states[:, 18:21, 2] != 0).any(axis=1)
+        for i in np.flatnonzero(too_close).tolist():
+            actions[i] = random.randrange(self.action_size - 1)
+        for i in np.flatnonzero(exploring).tolist():
+            if objective_ahead[i]:
+                actions[i] = 2
+            else:
+                actions[i] = self.random_actions[random.randrange(len(self.random_actions) - 1)]
+                was_random[i] = True
+        greedy = ~too_close & ~exploring
+        if greedy.any():
+            actions[greedy] = np.argmax(self.inference.predict(states[greedy]), axis=1)
+        return actions, was_random
+
     def act_move_2_door(self, me, door, logger=None):
         # guided to the middle of the door
         if logger: logger.debug(0, f"me & door: {(me.x, me.y)} {(door.x + door.width / 2, door.y + door.height / 2)}")
@@ -91,46 +128,37 @@ class SLAMAgent:
         if logger: logger.debug(0, "moved to the door!")
         return out
 
-    def replay(self, batch_size):
-        minibatch = []
+    def replay(self, batch_size, user_quit=None):
+        # user_quit returns True when the window was closed, None without a window
+        indexes = self.memory.sample_indexes(batch_size)
+        states, actions, rewards, next_states, terminals = self.memory.batch(indexes)
 
-        if len(self.temp_memory) > 0:
-            minibatch.extend(self.temp_memory)
-            self.memory.extend(self.temp_memory)
-            self.temp_memory = []
-
-        if len(self.memory) > batch_size:
-            try:
-                minibatch.extend(random.sample(self.memory, batch_size - len(minibatch)))
-            except:
-                print('Error:', len(self.memory), batch_size, len(minibatch))
-        else:
-            minibatch.extend(random.sample(self.memory, len(self.memory) - len(minibatch)))
+        if user_quit is not None and user_quit():
+            raise ExitException("User quit while replaying/fitting", None)
 
         entropy = 0.0
-
-        for i, [state, action, reward, next_state, terminal] in enumerate(minibatch):
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.display.quit()
-                    pygame.quit()
-                    raise ExitException("User quit while replaying/fitting", None)
-            target = reward
-            if not terminal:
-                print("predict..")
-                target = (reward + self.gamma * np.amax(self.model.predict(next_state)[0]))
-            out = self.model.predict(state)
+        if len(actions) > 0:
+            # the whole minibatch at once: two forward passes and a single gradient step
+            next_values = np.amax(self.model.predict(next_states, verbose=0), axis=1)
+            out = self.model.predict(states, verbose=0)
             target_f = out.copy()
-            target_f[0][action] = target
-            self.model.fit(state, target_f, epochs=EPOCHS, verbose=0, use_multiprocessing=True)
-            policy_probs = np.squeeze(tf.nn.softmax(out, axis=1))
-            entropy -= np.sum(policy_probs * np.log2(policy_probs + 1e-10))
+            targets = np.where(terminals, rewards, rewards + self.gamma * next_values)
+            target_f[np.arange(len(actions)), actions] = targets
+            if self.prioritized:
+                self.model.fit(states, target_f, sample_weight=self.memory.weights(indexes), batch_size=len(actions),
+                               epochs=EPOCHS, verbose=0)
+                self.memory.update_priorities(indexes, targets - out[np.arange(len(actions)), actions])
+            else:
+                self.model.fit(states, target_f, batch_size=len(actions), epochs=EPOCHS, verbose=0)
+            self.inference.sync(self.model)
+            policy_probs = tf.nn.softmax(out, axis=1).numpy()
+            entropy = -np.sum(policy_probs * np.log2(policy_probs + 1e-10))
 
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
-        if len(minibatch) > 0:
-            entropy_out = entropy / len(minibatch)
+        if len(actions) > 0:
+            entropy_out = entropy / len(actions)
         else:
             entropy_out = entropy
 
@@ -142,4 +170,5 @@ class SLAMAgent:
 
     def load(self, name, last_random_value):
         self.model.load_weights(name)
+        self.inference.sync(self.model)
         self.epsilon = last_random_value
@@ -1,38 +1,74 @@
-import json
 import random
 
 import numpy as np
-import pygame
-import cv2
 
 from SLAMRobot import SLAMAgent
 from metrics import MetricsLogger
-from utils.utils import Check_Collisions, Game_Object, Room, Agent, ExitException
+from utils.utils import Check_Collisions, Game_Object, ExitException
+from utils.sensor import RaySensor
+from utils.codec import ObservationCodec
+from utils.maps import load_map
+from utils.world import World, WorldField
+from utils.state import WorldState, step, observe
+from utils import geometry
 from datetime import datetime
-from pygame import Rect
 
 EPISODES = 5000
 REPLIES = 100
+# pixels per cell of the distance field rasterized on map load, the agent then reads its clearance from it, None
+# to skip it
+DISTANCE_FIELD_RESOLUTION = None
+# directory of the memory mapped static observation tables, None to always cast the static rays
+STATIC_LOOKUP_DIRECTORY = None
+# fill the whole table of the map before training instead of on first use
+STATIC_LOOKUP_PRECOMPUTE = False
+# eye points whose 360 degree scan is kept for rotations and revisits, None to disable the cache
+SCAN_CACHE_SIZE = None
+# sensor model: rays cast over the angular range up to the max range, resampled to the 40 entries of the network
+SENSOR_ANGLE_RANGE = 120
+SENSOR_RAY_COUNT = 40
+SENSOR_MAX_RANGE = 220
+# precision of the observations kept in the replay memory: 'exact' (needs 40 rays),
+# 'float16', 'uint8' or 'auto' for 'exact' when the sensor allows it and 'float16' otherwise, None to keep them
+# as float64
+REPLAY_PRECISION = 'auto'
+# geometry kernels of the sensor: 'numpy', 'numba' (when installed) or 'auto' for the fastest available
+GEOMETRY_BACKEND = 'numpy'
+# debug message of each kind of collision reported by SegmentTable.collision
+COLLISION_MESSAGES = dict(field="Collision found on the distance field", furniture="Collision due to a room's object",
+                          object="Collision due to an object's object", floor="Collision with floor")
 
 
 class Training:
+    _rooms = WorldField('rooms')
+    _floor = WorldField('floor')
+    _doors = WorldField('doors')
+    _agent = WorldField('agent')
+    _objective = WorldField('objective')
+    _screen = WorldField('screen')
+    _segments = WorldField('segments')
+
     def __init__(self, env_width, env_heigth, multiplier, environment, path='./metrics/'):
         self._changed = None
-        self._type_to_sprite = None
-        self._screen = None
-        self._agent = Agent(9999, 9999, 8, 8, 0, 'agent', 90)
-        self._objective = Game_Object(9800, 9800, 15, 15, 0, 'objective')
-        self._rooms = []
+        # pygame window and sprites, only created when the training is rendered
+        self._renderer = None
+        # dynamic state of a headless episode, stepped without any sprite
+        self._state = None
+        # map, indexes and entities, shared with the environment
+        self._world = World(multiplier, DISTANCE_FIELD_RESOLUTION)
         self._env_width = env_width
         self._env_height = env_heigth
         self._frame_size = (int(self._env_width), int(self._env_height))
         self._multiplier = multiplier
+        # None to train without the simulator, and without pygame
         self._environment = environment
+        if self._environment is not None:
+            self._environment.use_world(self._world)
         self._agent_start_x = 198
         self._agent_start_y = 268
         self._checker = Check_Collisions()
         self._is_agent_looking = False
-        self._floor = None
+        geometry.set_backend(GEOMETRY_BACKEND)
         self._logger = MetricsLogger(path, 'metric_name', ['id', 'entropy', 'epsilon', 'terminal', 'number-rooms',
                                                            'env-width', 'env-height', 'frame-count', 'frames-tot',
                                                            'score', 'room-changes', 'random-actions', 'reward'])
@@ -40,15 +76,16 @@ class Training:
         self._frame_count = 0
         self._tot_frames = 100
         self._score = 0
-        self._doors = []
         self._video_writer = None
-        self._font = None
         self._door_step = 0
         self._action = 2
         self._frame_since_cross = 0
 
     def run_training(self, render_on=False, video_rec_on=False, logic_drive_on=False):
-        slam_agent, speed, state_size = self.training_setup()
+        slam_agent, speed, state_size = self.training_setup(render_on)
+        if video_rec_on and not render_on:
+            self._logger.debug(0, "Video recording needs rendering, not recording")
+            video_rec_on = False
         if video_rec_on: self.video_recorder_setup()
         if logic_drive_on:
             self._logger.debug(0, "With LOGIC_DRIVER")
@@ -61,13 +98,16 @@ class Training:
             self._dist_to_objective = 1000
             random_actions = 0
             room_changes = 0
-            state = np.reshape(self._environment.project_segments()[0], [1, state_size, 3])
+            if render_on:
+                state = np.reshape(self._world.observe()[0], [1, state_size, 3])
+            # both are drawn from the free positions of the map, no retry needed
             self.reset_objective()
             self.reset_agent()
-            while not self.on_freespace(self._agent):
-                self.reset_agent()
-            while not self.on_freespace_objective(self._objective):
-                self.reset_objective()
+            self._world.reset()
+            if not render_on:
+                self._state = self.snapshot()
+                state = np.reshape(observe(self._state, self._segments, self._world.sensor,
+                                           static_sources=self._world.static_sources())[0], [1, state_size, 3])
 
             while not terminal:
                 self._frame_count += 1
@@ -87,9 +127,13 @@ class Training:
                 reward_accumulator += reward
                 if video_rec_on: self.video_record_frame()
 
+            scan_cache = self._world.scan_cache()
+            if scan_cache is not None:
+                self._logger.debug(self._frame_count, f"scan cache: {scan_cache.hits} hits {scan_cache.misses} misses "
+                                                      f"{scan_cache.rays_cast} rays cast {len(scan_cache)} scans")
             self._logger.debug(self._frame_count, "Start agent replay.")
             try:
-                entropy, exploration = slam_agent.replay(REPLIES)
+                entropy, exploration = slam_agent.replay(REPLIES, self.user_quit if render_on else None)
                 self._logger.log(self._frame_count, [i, entropy, exploration, terminal,
                                                      len(self._rooms), self._env_width, self._env_height,
                                                      self._frame_count, self._tot_frames,
@@ -104,23 +148,25 @@ class Training:
         self._logger.debug(self._frame_count, "Weights saving...")
         slam_agent.save("test")
         self._logger.debug(self._frame_count, "Weights saving completed.")
-        pygame.quit()
+        if self._renderer is not None:
+            self._renderer.close()
+            self._renderer = None
 
-    def training_setup(self):
+    def training_setup(self, render_on=False):
         state_size = 40
-        slam_agent = SLAMAgent(state_size, 3)
         speed = 2
-        pygame.init()
-        pygame.font.init()
-        fontpath = pygame.font.get_default_font()
-        size = 24
-        self._font = pygame.font.Font(fontpath, size)
         self.generate_target_pos()
-        self._screen = pygame.display.set_mode(self._frame_size)
-        self._environment._agent = self._agent
-        self._environment._objective = self._objective
-        self._environment._floor = self._floor
-        self._environment._screen = self._screen
+        if render_on:
+            self._screen = self.renderer().open(self._frame_size)
+        self._world.use_sensor(RaySensor.with_ray_count(SENSOR_ANGLE_RANGE, SENSOR_RAY_COUNT, SENSOR_MAX_RANGE))
+        codec = None if REPLAY_PRECISION is None else ObservationCodec(self._world.sensor, REPLAY_PRECISION)
+        slam_agent = SLAMAgent(state_size, 3, codec)
+        if STATIC_LOOKUP_DIRECTORY is not None:
+            self._world.use_static_lookup(STATIC_LOOKUP_DIRECTORY)
+            if STATIC_LOOKUP_PRECOMPUTE:
+                self._world.static_lookup().precompute(self._logger)
+        if SCAN_CACHE_SIZE is not None:
+            self._world.use_scan_cache(SCAN_CACHE_SIZE)
         self._tot_frames = int((100 * len(self._rooms)) + 0.005 * (self._env_width * self._env_height))
         self._logger.debug(self._frame_count,
                            f"training with: {self._tot_frames} frames {EPISODES} episodes {REPLIES} replies")
@@ -128,24 +174,28 @@ class Training:
 
     def reward_no_render(self, random_actions, slam_agent, speed, state, state_size, terminal):
         reward = 0
-        action, was_it_random = slam_agent.act(state)
+        agent_rect = self._state.agent_rects((self._agent.width, self._agent.height))[0]
+        action, was_it_random = slam_agent.act(state, self.clearance(agent_rect[:2] + agent_rect[2:] // 2))
         if was_it_random:
             random_actions += 1
-        self.update_agent_pos_by_action(action, speed)
-        if self.is_agent_colliding_world():
-            terminal = True
-        elif self._frame_count > self._tot_frames:
+        next_world_state, observations, _, terminals = step(self._state, action, self._segments, self._world.sensor,
+                                                            speed, self._tot_frames, (self._agent.width,
+                                                                                      self._agent.height),
+                                                            (self._objective.width, self._objective.height),
+                                                            self._world.static_sources())
+        if terminals[0]:
             terminal = True
+            if self._frame_count <= self._tot_frames:
+                self.is_agent_colliding_world(tuple(next_world_state.agent_rects()[0].tolist()))
         reward += 1
-        next_state = np.reshape(self._environment.project_segments()[0], [1, state_size, 3])
-        if self._environment.project_segments()[1]:
+        next_state = np.reshape(observations[0], [1, state_size, 3])
+        if observations[0, -1, 2]:
             reward += 3
-            new_dist_to_objective = self._checker.point_point_distance((self._agent.x, self._agent.y),
-                                                                       (self._objective.x,
-                                                                        self._objective.y))
-            if new_dist_to_objective < self._dist_to_objective:
-                self._dist_to_objective = new_dist_to_objective
+            # step keeps the distance only when it got closer
+            if next_world_state.dist_to_objective[0] < self._state.dist_to_objective[0]:
                 reward += 5
+        self._state = next_world_state
+        self._dist_to_objective = self._state.dist_to_objective[0].item()
         slam_agent.remember(state, action, reward, next_state, terminal)
         state = next_state
         return random_actions, reward, state, terminal
@@ -174,7 +224,7 @@ class Training:
             was_it_random = False
         else:
             # neural based navigation
-            self._action, was_it_random = slam_agent.act(state)
+            self._action, was_it_random = slam_agent.act(state, self.clearance(self._agent.sprite.rect.center))
 
         if was_it_random:
             random_actions += 1
@@ -188,7 +238,7 @@ class Training:
             terminal = True
             next_state = state
         else:
-            next_state = np.reshape(self._environment.project_segments()[0], [1, state_size, 3])
+            next_state = np.reshape(self._world.observe()[0], [1, state_size, 3])
 
         if self._frame_count > 5:
             slam_agent.remember(state, self._action, reward, next_state, terminal)
@@ -200,7 +250,7 @@ class Training:
         if self._frame_count % 10 == 0 and reward > 0:
             reward -= 1
             self._logger.debug(self._frame_count, 'rew -1')
-        if self._environment.project_segments()[1]:
+        if self._world.observe()[1]:
             reward += 3
             new_dist_to_objective = self._checker.point_point_distance((self._agent.x, self._agent.y),
                                                                        (self._objective.x,
@@ -225,38 +275,19 @@ class Training:
     def visual_scene_update(self, action, speed):
         self._screen.fill((30, 30, 30))
         room_changed = self.update_agent_pos_by_action(action, speed)
-        self._environment._rooms = self._rooms
-        self._environment._screen = self._screen
         self._environment.draw_model()
-        pygame.display.update()
+        self._renderer.present()
 
         return room_changed
 
-    def on_freespace(self, target):
-        res = True
-        for r in self._rooms:
-            for c in r.children:
-                if c.x < target.x < target.x + target.width < c.x + c.width and \
-                        c.y < target.y < target.y + target.height < c.y + c.height:
-                    return False
-        return res
-
-    def on_freespace_objective(self, target):
-        res = True
-        rt = target.sprite.rect
-        for r in self._rooms:
-            for c in r.children:
-                rc = Rect(c.x, c.y, c.width, c.height)
-                if rt.colliderect(rc):
-                    return False
-        return res
+    def clearance(self, eye_point):
+        # distance from the eye to the closest obstacle in sensor ranges, None without a distance field
+        if self._segments.field is None:
+            return None
+        return self._segments.field.clearance(eye_point[0], eye_point[1]).item() / self._world.sensor.max_range
 
     def room_sensor(self):
-        for i, room in enumerate(self._rooms):
-            if room.x < self._agent.x < room.x + room.width and \
-                    room.y < self._agent.y < room.y + room.height:
-                return i
-        return -1
+        return self._segments.rooms.room_at(self._agent.x, self._agent.y)
 
     def update_agent_pos_by_action(self, action, speed):
         if action == 0:
@@ -284,182 +315,98 @@ class Training:
             elif self._agent._target_rot == 315:
                 self._agent.x += speed
                 self._agent.y += speed
-        if self.room_sensor() != self._agent._last_room:
-            self._agent._last_room = self.room_sensor()
+        room = self.room_sensor()
+        if room != self._agent._last_room:
+            self._agent._last_room = room
             return True
         return False
 
-    @staticmethod
-    def user_quit(slam_agent):
-        for event in pygame.event.get():
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_s:
-                    slam_agent.save("test")
-            if event.type == pygame.QUIT:
-                pygame.display.quit()
-                pygame.quit()
-                return True
+    def user_quit(self, slam_agent=None):
+        # only a rendered training has a window to close
+        if self._renderer is None:
+            return False
+        if self._renderer.user_quit(slam_agent):
+            self._renderer = None
+            return True
         return False
 
     def reset_agent(self):
         self._agent._target_rot = 90
-        ridx = random.randint(0, len(self._rooms) - 1)
-        self._agent.x = int(random.uniform(self._rooms[ridx].x * 1.15,
-                                           (self._rooms[ridx].x + self._rooms[ridx].width * 0.85)))
-        self._agent.y = int(random.uniform(self._rooms[ridx].y * 1.15,
-                                           (self._rooms[ridx].y + self._rooms[ridx].height * 0.85)))
-        self._agent.sprite.rect.x = self._agent_start_x
-        self._agent.sprite.rect.y = self._agent_start_y
+        self._agent.x, self._agent.y = self._segments.free_space.sample_agent(self._agent.width, self._agent.height)
+        if self._agent.sprite:
+            self._agent.sprite.rect.x = self._agent_start_x
+            self._agent.sprite.rect.y = self._agent_start_y
         self._agent.last_room = self.room_sensor()
 
     def reset_objective(self):
-        ridx = random.randint(0, len(self._rooms) - 1)
-        self._objective.x = int(random.uniform(self._rooms[ridx].x * 1.15,
-                                               (self._rooms[ridx].x + self._rooms[ridx].width * 0.85)))
-        self._objective.y = int(random.uniform(self._rooms[ridx].y * 1.15,
-                                               (self._rooms[ridx].y + self._rooms[ridx].height * 0.85)))
-        self._objective.sprite.rect.x = self._objective.x
-        self._objective.sprite.rect.y = self._objective.y
-
-    def is_agent_colliding_world(self):
-        is_agent_in_room = False
-        for room in self._rooms:
-            if not room.sprite.rect.contains(self._agent.sprite.rect):
-                pass
-
-            else:
-                is_agent_in_room = True
-                for room_child in room.children:
-                    if self._agent.sprite.rect.colliderect(room_child.sprite.rect):
-                        self._logger.debug(self._frame_count, "Collision due to a room's object")
-                        return True
-                    for child in room_child.children:
-                        if self._agent.sprite.rect.colliderect(child.sprite.rect):
-                            self._logger.debug(self._frame_count, "Collision due to an object's object")
-                            return True
-        if not is_agent_in_room:
-            if not self._floor.sprite.rect.contains(self._agent.sprite.rect):
-                self._logger.debug(self._frame_count, "Collision with floor")
-                return True
-        return False
+        self._objective.x, self._objective.y = self._segments.free_space.sample_objective(self._objective.width,
+                                                                                          self._objective.height)
+        if self._objective.sprite:
+            self._objective.sprite.rect.x = self._objective.x
+            self._objective.sprite.rect.y = self._objective.y
+
+    def snapshot(self):
+        """Dynamic state of the episode: agent pose, objective and counters. The map is shared, not copied."""
+        return WorldState(agent_x=self._agent.x, agent_y=self._agent.y, rot=self._agent._target_rot,
+                          last_room=self._agent._last_room, objective_x=self._objective.x,
+                          objective_y=self._objective.y, frame_count=self._frame_count,
+                          frame_since_cross=self._frame_since_cross, score=self._score,
+                          dist_to_objective=self._dist_to_objective)
+
+    def restore(self, state, index=0):
+        self._agent.x, self._agent.y = state.agent_x[index].item(), state.agent_y[index].item()
+        self._agent._target_rot = state.rot[index].item()
+        self._agent._last_room = state.last_room[index].item()
+        self._objective.x, self._objective.y = state.objective_x[index].item(), state.objective_y[index].item()
+        if self._objective.sprite:
+            self._objective.sprite.rect.x = self._objective.x
+            self._objective.sprite.rect.y = self._objective.y
+        self._frame_count = state.frame_count[index].item()
+        self._frame_since_cross = state.frame_since_cross[index].item()
+        self._score = state.score[index].item()
+        self._dist_to_objective = state.dist_to_objective[index].item()
+        self._world.reset()
+
+    def is_agent_colliding_world(self, agent_rect=None):
+        if agent_rect is None:
+            agent_rect = tuple(self._agent.sprite.rect)
+        collision = self._segments.collision(agent_rect)
+        if collision is None:
+            return False
+        self._logger.debug(self._frame_count, COLLISION_MESSAGES[collision])
+        return True
 
     def load_model(self, file_path, render_on):
         self._logger.debug(self._frame_count, f"Training on map: {file_path}")
-        with open("./environments/" + file_path, 'r') as infile:
-            json_string = infile.read()
-
-        deserialized_environment_dict = json.loads(json_string)
-        room_number = deserialized_environment_dict["roomNumber"]
-        floor_dict = deserialized_environment_dict["floor"]
-
-        self._env_width = floor_dict["width"] + (8 * room_number * self._multiplier)
-        self._env_height = floor_dict["height"] + (8 * room_number * self._multiplier)
+        floor, rooms = load_map("./environments/" + file_path)
+        self._env_width = floor.width + (8 * len(rooms) * self._multiplier)
+        self._env_height = floor.height + (8 * len(rooms) * self._multiplier)
         self._frame_size = (int(self._env_width), int(self._env_height))
-        self._screen = pygame.display.set_mode(self._frame_size)
-        self._rooms = []
-        self._type_to_sprite = dict(hall=pygame.image.load('../textures/hall_texture.png').convert_alpha(),
-                                    kitchen=pygame.image.load('../textures/kitchen_texture.png').convert_alpha(),
-                                    bedroom=pygame.image.load('../textures/bedroom_texture.png').convert_alpha(),
-                                    bathroom=pygame.image.load('../textures/bathroom_texture.png').convert_alpha(),
-                                    door=pygame.image.load('../textures/door_texture.png').convert_alpha(),
-                                    toilet=pygame.image.load('../textures/toilet_texture.png').convert_alpha(),
-                                    shower=pygame.image.load('../textures/shower_texture.png').convert_alpha(),
-                                    bed=pygame.image.load('../textures/green_bed_texture.png').convert_alpha(),
-                                    bedside=pygame.image.load('../textures/bedside_texture.png').convert_alpha(),
-                                    sofa=pygame.image.load('../textures/sofa_texture.png').convert_alpha(),
-                                    hall_table=pygame.image.load('../textures/hall_table_texture.png').convert_alpha(),
-                                    table=pygame.image.load('../textures/table_texture.png').convert_alpha(),
-                                    chair=pygame.image.load('../textures/chair_texture.png').convert_alpha(),
-                                    desk=pygame.image.load('../textures/desk_texture.png').convert_alpha(),
-                                    sink=pygame.image.load('../textures/sink_texture.png').convert_alpha(),
-                                    wardrobe=pygame.image.load('../textures/wardrobe_texture.png').convert_alpha(),
-                                    cupboard=pygame.image.load('../textures/wardrobe_texture.png').convert_alpha(),
-                                    floor=pygame.image.load('../textures/floor_texture.png').convert_alpha(),
-                                    agent=pygame.image.load('../textures/agent_texture_mockup.png').convert_alpha(),
-                                    objective=pygame.image.load(
-                                        '../textures/objective_texture_mockup.png').convert_alpha())
-
-        floor_sprite = pygame.sprite.Sprite()
-        floor_sprite.image = pygame.transform.scale(self._type_to_sprite['floor'],
-                                                    (int(floor_dict["width"]), int(floor_dict["height"])))
-        floor_sprite.rect = pygame.Rect(floor_dict["x"], floor_dict["y"], floor_dict["width"], floor_dict["height"])
-        self._floor = Game_Object(floor_dict["x"], floor_dict["y"], floor_dict["width"], floor_dict["height"],
-                                  floor_sprite, 'floor')
-        for i in range(0, room_number):
-            room_dict = deserialized_environment_dict["R" + str(i)]
-            room_sprite = pygame.sprite.Sprite()
-            room_sprite.image = pygame.transform.scale(self._type_to_sprite[room_dict["type"]],
-                                                       (int(room_dict["width"]), int(room_dict["height"])))
-            room_sprite.rect = pygame.Rect(room_dict["x"], room_dict["y"], room_dict["width"], room_dict["height"])
-            deserialized_room = Room(room_dict["x"], room_dict["y"], room_dict["width"], room_dict["height"], i,
-                                     room_sprite, room_dict["type"])
-            door_dict = room_dict["door"]
-            door_sprite = pygame.sprite.Sprite()
-            if door_dict["width"] != 0:
-                door_sprite.image = pygame.transform.scale(pygame.transform.rotate(self._type_to_sprite['door'], 90),
-                                                           (int(2.5 * self._multiplier), int(1.0 * self._multiplier)))
-            else:
-                door_sprite.image = pygame.transform.scale(self._type_to_sprite['door'],
-                                                           (int(1.0 * self._multiplier), int(2.5 * self._multiplier)))
-            door_sprite.rect = pygame.Rect(door_dict["x"], door_dict["y"], door_dict["width"], door_dict["height"])
-            deserialized_room.door = Game_Object(door_dict["x"], door_dict["y"], door_dict["width"],
-                                                 door_dict["height"], door_sprite, 'door')
-            self._doors.append(deserialized_room.door)
-            for child_dict in room_dict["children"]:
-                child_rotation = 0
-                if child_dict["orientation"] == "W":
-                    child_rotation = -90
-                elif child_dict["orientation"] == "N":
-                    child_rotation = 180
-                elif child_dict["orientation"] == "E":
-                    child_rotation = 90
-                child_sprite = pygame.sprite.Sprite()
-                child_sprite.image = pygame.transform.scale(
-                    pygame.transform.rotate(self._type_to_sprite[child_dict["type"]], child_rotation),
-                    (int(child_dict["width"]), int(child_dict["height"])))
-                child_sprite.rect = pygame.Rect(child_dict["x"], child_dict["y"], child_dict["width"],
-                                                child_dict["height"])
-                deserialized_child = Game_Object(child_dict["x"], child_dict["y"], child_dict["width"],
-                                                 child_dict["height"], child_sprite, child_dict["type"])
-                deserialized_room.children.append(deserialized_child)
-
-                for childchild_dict in child_dict["children"]:
-                    childchild_rotation = 0
-                    if childchild_dict["orientation"] == "W":
-                        childchild_rotation = -90
-                    elif childchild_dict["orientation"] == "N":
-                        childchild_rotation = 180
-                    elif childchild_dict["orientation"] == "E":
-                        childchild_rotation = 90
-                    childchild_sprite = pygame.sprite.Sprite()
-
-                    childchild_sprite.image = pygame.transform.scale(
-                        pygame.transform.rotate(self._type_to_sprite[childchild_dict["type"]], childchild_rotation),
-                        (int(childchild_dict["width"]), int(childchild_dict["height"])))
-                    childchild_sprite.rect = pygame.Rect(childchild_dict["x"], childchild_dict["y"],
-                                                         childchild_dict["width"], childchild_dict["height"])
-                    deserialized_child_child = Game_Object(childchild_dict["x"], childchild_dict["y"],
-                                                           childchild_dict["width"], childchild_dict["height"],
-                                                           childchild_sprite, childchild_dict["type"])
-                    deserialized_child.children.append(deserialized_child_child)
-            self._rooms.append(deserialized_room)
-
-        agent_sprite = pygame.sprite.Sprite()
-        agent_sprite.image = pygame.transform.scale(self._type_to_sprite['agent'], (int(self._agent.width),
-                                                                                    int(self._agent.height)))
-        agent_sprite.rect = pygame.Rect(self._agent.x, self._agent.y, self._agent.width, self._agent.height)
-        self._agent.sprite = agent_sprite
-        self._agent.image = self._agent.sprite.image
-
-        objective_sprite = pygame.sprite.Sprite()
-        objective_sprite.image = pygame.transform.scale(self._type_to_sprite['objective'], (int(self._objective.width),
-                                                                                            int(self._objective.height)))
-        objective_sprite.rect = pygame.Rect(self._objective.x, self._objective.y, self._objective.width,
-                                            self._objective.height)
-        self._objective.sprite = objective_sprite
+        # a new window for every map, the previous one may have been closed with pygame
+        if self._renderer is not None:
+            self._renderer.close()
+            self._renderer = None
+        if render_on:
+            self._screen = self.renderer().open(self._frame_size)
+        self._world.teardown()
+        self._floor = floor
+        self._rooms = rooms
+        self._doors = [room.door for room in rooms]
+        if render_on:
+            self._renderer.attach_sprites(self._world)
+        self._world.compile()
         self.multiplier = 1.0
 
+    def renderer(self):
+        if self._renderer is None:
+            # imported here so that a training without rendering never loads pygame
+            from utils.rendering import Renderer
+            self._renderer = Renderer()
+        return self._renderer
+
     def generate_target_pos(self):
+        if self._environment is None:
+            return
         self._environment._objective_position = []
         for room in self._rooms:
             pos = (int(random.uniform(room.x * 1.15, room.x + room.width * 0.85)),
@@ -468,37 +415,27 @@ class Training:
 
     def is_front_to_door(self, thing: Game_Object):
         ths_w, ths_d = 4, 12
-        p1 = np.array((thing.x + thing.width / 2, thing.y + thing.height / 2))
-        for i, door in enumerate(self._doors):
-            p2 = np.array((door.x + door.width / 2, door.y + door.height / 2))
-            in_front = abs(p1[0] - p2[0]) < ths_d and abs(p1[1] - p2[1]) < ths_w
-            in_front |= abs(p1[1] - p2[1]) < ths_d and abs(p1[0] - p2[0]) < ths_w
-            if in_front:
-                self._logger.debug(self._frame_count, "door in front")
-                return True
+        door = self._segments.doors.in_front(thing.x + thing.width / 2, thing.y + thing.height / 2, ths_w, ths_d)
+        if door is not None:
+            self._logger.debug(self._frame_count, "door in front")
+            return True
         return False
 
     def get_closest_door(self, thing: Game_Object):
         ths_w, ths_d = 10, 40
-        p1 = np.array((thing.x + thing.width / 2, thing.y + thing.height / 2))
-        for i, door in enumerate(self._doors):
-            p2 = np.array((door.x + door.width / 2, door.y + door.height / 2))
-            in_front = abs(p1[0] - p2[0]) < ths_d and abs(p1[1] - p2[1]) < ths_w
-            in_front |= abs(p1[1] - p2[1]) < ths_d and abs(p1[0] - p2[0]) < ths_w
-            if in_front:
-                self._logger.debug(self._frame_count, "this door in front")
-                return door
-        return None
+        door = self._segments.doors.in_front(thing.x + thing.width / 2, thing.y + thing.height / 2, ths_w, ths_d)
+        if door is not None:
+            self._logger.debug(self._frame_count, "this door in front")
+        return door
 
     def video_recorder_setup(self):
+        import cv2
         video_filename = f'video/simulation_{datetime.now().strftime("%Y%m%d-%H%M")}.mp4'
         fourcc = cv2.VideoWriter_fourcc(*'H264')
         self._video_writer = cv2.VideoWriter(video_filename, fourcc, 30.0, self._frame_size, isColor=True)
 
     def video_record_frame(self):
-        text_surface = self._font.render(f'{self._frame_count}', True, (255, 255, 255))
-        self._screen.blit(text_surface, (10, 10))
-        pygame_surface = pygame.surfarray.array3d(self._screen)
-        numpy_surface = np.transpose(pygame_surface, (1, 0, 2))
+        import cv2
+        numpy_surface = self._renderer.frame(f'{self._frame_count}')
         bgr_frame = cv2.cvtColor(numpy_surface, cv2.COLOR_RGB2BGR)
         self._video_writer.write(bgr_frame)
@@ -0,0 +1,456 @@
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from utils import geometry
+from utils.utils import Game_Object, Room, Check_Collisions, check_line_line_collision
+from utils.sensor import RaySensor, compile_map, door_opening, game_object_rect
+from utils.world import World
+from utils.env import NavigationEnv, VectorNavigationEnv
+from utils.inference import NumpyModel
+from utils.maps import save_map
+from utils.pool import EnvPool
+
+MULTIPLIER = 8.5
+
+
+def make_map(room_number, furniture_number, seed=0):
+    """Synthetic house: a row of square rooms with furniture_number random pieces of furniture spread among them."""
+    rng = random.Random(seed)
+    size = 20 * MULTIPLIER
+    rooms = []
+    for i in range(room_number):
+        room = Room(50 + i * size, 50, size, size, i, None, 'hall')
+        room.door = Game_Object(room.x + size, room.y + size / 3, 0, 2.5 * MULTIPLIER, None, 'door')
+        rooms.append(room)
+    for i in range(furniture_number):
+        room = rooms[i % room_number]
+        width, height = rng.uniform(4, 20), rng.uniform(4, 20)
+        room.children.append(Game_Object(rng.uniform(room.x, room.x + room.width - width),
+                                         rng.uniform(room.y, room.y + room.height - height),
+                                         width, height, None, 'table'))
+    floor = Game_Object(20, 20, room_number * size + 60, size + 60, None, 'floor')
+    return rooms, floor
+
+
+def random_poses(rooms, number, seed=0):
+    rng = random.Random(seed)
+    poses = []
+    for _ in range(number):
+        room = rng.choice(rooms)
+        poses.append(((int(rng.uniform(room.x, room.x + room.width)), int(rng.uniform(room.y, room.y + room.height))),
+                      rng.choice(range(0, 360, 45))))
+    return poses
+
+
+def time_per_call(function, arguments, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for argument in arguments:
+            function(*argument)
+        best = min(best, (time.perf_counter() - start) / len(arguments))
+    return best
+
+
+def bench_sensor(args):
+    sensors = [RaySensor(), RaySensor(), RaySensor(sphere_trace=True)]
+    objective = (0, 0, 15, 15)
+    print('furniture  segments  brute us/ray  grid us/ray' + ('  field us/ray' if args.field else ''))
+    for furniture_number in args.furniture:
+        rooms, floor = make_map(args.rooms, furniture_number)
+        poses = random_poses(rooms, args.poses)
+        tables = [compile_map(rooms, floor, MULTIPLIER, grid_min_segments=None),
+                  compile_map(rooms, floor, MULTIPLIER, grid_min_segments=0)]
+        if args.field:
+            tables.append(compile_map(rooms, floor, MULTIPLIER, field_resolution=args.field))
+        timings = [time_per_call(lambda eye, rot, sensor=sensor, table=table: sensor.project(eye, rot, table,
+                                                                                              objective), poses)
+                   / sensor.ray_number * 1e6 for sensor, table in zip(sensors, tables)]
+        print(f'{furniture_number:9d} {len(tables[0]):9d} ' + ' '.join(f'{timing:12.2f}' for timing in timings))
+
+
+def bench_sensor_model(args):
+    sensors = {'full': RaySensor()}
+    for ray_count in args.ray_counts:
+        sensors[f'{ray_count} rays'] = RaySensor.with_ray_count(ray_count=ray_count)
+    objective = (0, 0, 15, 15)
+    print('furniture  sensor          us/pose  mean error')
+    for furniture_number in args.furniture:
+        rooms, floor = make_map(args.rooms, furniture_number)
+        poses = random_poses(rooms, args.poses)
+        table = compile_map(rooms, floor, MULTIPLIER)
+        reference = np.array([sensors['full'].project(eye, rot, table, objective)[0] for eye, rot in poses])
+        for name, sensor in sensors.items():
+            timing = time_per_call(lambda eye, rot: sensor.project(eye, rot, table, objective), poses)
+            observations = np.array([sensor.project(eye, rot, table, objective)[0] for eye, rot in poses])
+            error = np.abs(observations[:, :, 1] - reference[:, :, 1]).mean()
+            print(f'{furniture_number:9d}  {name:14s} {timing * 1e6:8.0f}  {error:10.4f}')
+
+
+def linear_collision(rooms, rect):
+    # the scan the training loop did before the obstacle hash: every piece of every room, with pygame semantics
+    x, y, w, h = rect
+    for room in rooms:
+        for room_child in room.children:
+            for child in [room_child] + room_child.children:
+                cx, cy, cw, ch = int(child.x), int(child.y), int(child.width), int(child.height)
+                if x < cx + cw and cx < x + w and y < cy + ch and cy < y + h:
+                    return True
+    return False
+
+
+# stands for the pygame.Rect of a sprite in scalar_observation
+Rect = namedtuple('Rect', 'x y width height')
+
+
+def scalar_observation(eye_point, rot, rooms, floor, objective_rect, multiplier):
+    # the caster Environment.project_segments ran before RaySensor: one ray at a time against the rect of every
+    # room, with the hits on its door dropped, of every piece of furniture and of the floor, a floor hit inside a
+    # room being dropped. Rects are truncated like the pygame.Rect of the sprites, contains and collidepoint keep
+    # the pygame semantics.
+    checker = Check_Collisions()
+    room_rects = [Rect(*game_object_rect(room)) for room in rooms]
+    door_rects = [Rect(*(int(value) for value in door_opening(room.door, multiplier))) for room in rooms]
+    pieces = [Rect(*game_object_rect(child)) for room in rooms for room_child in room.children
+              for child in [room_child] + room_child.children]
+    floor_rect, objective_rect = Rect(*game_object_rect(floor)), Rect(*objective_rect)
+    angle_range, step = 120, 3
+    slope = (rot + angle_range / 2) % 360
+    points, is_agent_looking_at_objective = [], False
+    for _ in range(0, angle_range, step):
+        is_agent_looking_at_objective = False
+        view_point = (eye_point[0] + math.cos(math.radians(slope)) * 220,
+                      eye_point[1] - math.sin(math.radians(slope)) * 220)
+        line = (eye_point[0], eye_point[1], view_point[0], view_point[1])
+        slope = (slope - step) % 360
+        intersection_points = []
+        for room_rect, door_rect in zip(room_rects, door_rects):
+            wall_points = [point for point in (check_line_line_collision(line, wall) for wall in (
+                (room_rect.x, room_rect.y, room_rect.x, room_rect.y + room_rect.height),
+                (room_rect.x, room_rect.y + room_rect.height, room_rect.x + room_rect.width,
+                 room_rect.y + room_rect.height),
+                (room_rect.x + room_rect.width, room_rect.y + room_rect.height, room_rect.x + room_rect.width,
+                 room_rect.y),
+                (room_rect.x, room_rect.y, room_rect.x + room_rect.width, room_rect.y)))
+                           if point is not None and not (door_rect.x <= point[0] < door_rect.x + door_rect.width and
+                                                         door_rect.y <= point[1] < door_rect.y + door_rect.height)]
+            if wall_points:
+                intersection_points.append(min(wall_points, key=lambda point: checker.point_point_distance(
+                    eye_point, point)))
+        for piece in pieces:
+            intersection_point = checker.check_line_rect_collision(line, piece)
+            if intersection_point is not None:
+                intersection_points.append(intersection_point)
+        intersection_point_floor = checker.check_line_rect_collision(line, floor_rect)
+        if intersection_point_floor is not None and not any(
+                checker.check_rect_contains_point(room_rect, intersection_point_floor) for room_rect in room_rects):
+            intersection_points.append(intersection_point_floor)
+        intersection_point_objective = checker.check_line_rect_collision(line, objective_rect)
+        if intersection_point_objective is not None:
+            intersection_points.append(intersection_point_objective)
+        if intersection_points:
+            distances = [checker.point_point_distance(eye_point, point) for point in intersection_points]
+            chosen_index = int(np.argmin(distances))
+            is_agent_looking_at_objective = intersection_points[chosen_index] == intersection_point_objective
+            points.append((slope / 359, distances[chosen_index] / 220, is_agent_looking_at_objective))
+        else:
+            points.append((slope / 359, 1, False))
+    return np.array(points, dtype=np.float64), is_agent_looking_at_objective
+
+
+def bench_parity(args):
+    # exits non-zero on the first map where the sensor does not see what scalar_observation sees, bit for bit
+    sensor = RaySensor()
+    print('seed  furniture  poses  brute mismatches  grid mismatches  scalar ms/pose  sensor us/pose')
+    mismatches = 0
+    for seed in range(args.seeds):
+        rooms, floor = make_map(args.rooms, args.furniture, seed=seed)
+        tables = [compile_map(rooms, floor, MULTIPLIER, grid_min_segments=None),
+                  compile_map(rooms, floor, MULTIPLIER, grid_min_segments=0)]
+        rng = random.Random(seed)
+        # objectives around the eye, in sight about half of the time
+        poses = [(eye, rot, (eye[0] + rng.randint(-120, 120), eye[1] + rng.randint(-120, 120), 21, 21))
+                 for eye, rot in random_poses(rooms, args.poses, seed=seed)]
+        references = [scalar_observation(eye, rot, rooms, floor, objective, MULTIPLIER)
+                      for eye, rot, objective in poses]
+        counts = []
+        for table in tables:
+            count = 0
+            for (eye, rot, objective), (expected, expected_looking) in zip(poses, references):
+                observation, looking = sensor.project(eye, rot, table, objective)
+                count += not np.array_equal(observation, expected) or looking != expected_looking
+            counts.append(count)
+        scalar_timing = time_per_call(lambda eye, rot, objective: scalar_observation(eye, rot, rooms, floor,
+                                                                                     objective, MULTIPLIER),
+                                      poses[:20], repeat=1)
+        sensor_timing = time_per_call(lambda eye, rot, objective: sensor.project(eye, rot, tables[1], objective),
+                                      poses)
+        print(f'{seed:4d} {args.furniture:10d} {len(poses):6d} {counts[0]:17d} {counts[1]:16d} '
+              f'{scalar_timing * 1e3:15.2f} {sensor_timing * 1e6:15.1f}')
+        mismatches += sum(counts)
+    if mismatches:
+        raise SystemExit(f'{mismatches} observations differ from the scalar caster')
+
+
+def bench_obstacles(args):
+    print('furniture  linear us/query  hash us/query  speedup')
+    for furniture_number in args.furniture:
+        rooms, floor = make_map(args.rooms, furniture_number)
+        obstacles = compile_map(rooms, floor, MULTIPLIER).obstacles
+        queries = [((eye[0] - 4, eye[1] - 4, 8, 8),) for eye, _ in random_poses(rooms, args.queries)]
+        for (rect,) in queries:
+            assert linear_collision(rooms, rect) == (obstacles.collision(rect) is not None)
+        linear = time_per_call(lambda rect: linear_collision(rooms, rect), queries)
+        hashed = time_per_call(obstacles.collision, queries)
+        print(f'{furniture_number:9d} {linear * 1e6:16.2f} {hashed * 1e6:14.2f} {linear / hashed:8.1f}')
+
+
+def as_tuple(result):
+    return result if isinstance(result, tuple) else (result,)
+
+
+def bench_geometry(args):
+    # integer end points, like the rays and the segments of a map
+    rng = np.random.default_rng(0)
+    columns = [rng.integers(0, 500, args.pairs).astype(np.float64) for _ in range(8)]
+    rays = np.stack(columns[:4], axis=1)[:args.rays]
+    segments = np.stack(columns[4:], axis=1)[:args.segments]
+    kernels = {'lines_collision': lambda backend: backend.lines_collision(*columns),
+               'hit_distances': lambda backend: backend.hit_distances(*columns),
+               'nearest_hits': lambda backend: backend.nearest_hits(rays, segments),
+               'point_distances': lambda backend: backend.point_distances(*columns[:4]),
+               'rects_contain_points': lambda backend: backend.rects_contain_points(*columns[:6])}
+    backends = [geometry.BACKENDS[name]() for name in geometry.available_backends()]
+    reference = backends[0]
+    timings = {}
+    for backend in backends:
+        for name, kernel in kernels.items():
+            kernel(backend)  # compiles the jitted kernels
+            timings[backend.name, name] = time_per_call(kernel, [(backend,)] * 3)
+            for expected, result in zip(as_tuple(kernel(reference)), as_tuple(kernel(backend))):
+                assert np.array_equal(expected, result, equal_nan=True), (backend.name, name)
+    print(f'{args.pairs} segment pairs, {len(rays)} rays x {len(segments)} segments')
+    print('kernel                 ' + ''.join(f'{backend.name + " ms":>12s} {"speedup":>8s}' for backend in backends))
+    for name in kernels:
+        print(f'{name:22s} ' + ''.join(f'{timings[backend.name, name] * 1e3:12.2f} '
+                                        f'{timings[reference.name, name] / timings[backend.name, name]:8.2f}'
+                                        for backend in backends))
+    rooms, floor = make_map(7, args.furniture)
+    poses = random_poses(rooms, 200)
+    table = compile_map(rooms, floor, MULTIPLIER, grid_min_segments=None)
+    sensor = RaySensor()
+    print(f'sensor, {args.furniture} pieces of furniture, {len(table)} segments')
+    for backend in backends:
+        geometry.set_backend(backend.name)
+        timing = time_per_call(lambda eye, rot: sensor.project(eye, rot, table, (0, 0, 15, 15)), poses)
+        print(f'{backend.name:22s} {timing / sensor.ray_number * 1e6:12.2f} us/ray')
+    geometry.set_backend(geometry.DEFAULT_BACKEND)
+
+
+def bench_env(args):
+    print('furniture  us/step  steps/s  episodes')
+    for furniture_number in args.furniture:
+        world = World(MULTIPLIER)
+        world.rooms, world.floor = make_map(args.rooms, furniture_number)
+        env = NavigationEnv(world, seed=0)
+        rng = random.Random(0)
+        actions = [rng.choice([0, 1, 2, 2]) for _ in range(args.steps)]
+        episodes = 1
+        env.reset()
+        start = time.perf_counter()
+        for action in actions:
+            if env.step(action)[2]:
+                env.reset()
+                episodes += 1
+        elapsed = time.perf_counter() - start
+        print(f'{furniture_number:9d} {elapsed / args.steps * 1e6:8.1f} {args.steps / elapsed:8.0f} {episodes:9d}')
+
+
+def bench_vector_env(args):
+    world = World(MULTIPLIER)
+    world.rooms, world.floor = make_map(args.rooms, args.furniture)
+    rng = np.random.default_rng(0)
+    print('    envs  us/frame  steps/s  speedup')
+    baseline = None
+    for number in args.envs:
+        env = VectorNavigationEnv(world, number, seed=0)
+        env.reset()
+        frames = max(1, args.steps // number)
+        actions = rng.choice([0, 1, 2, 2], size=(frames, number))
+        start = time.perf_counter()
+        for frame_actions in actions:
+            env.step(frame_actions)
+        elapsed = time.perf_counter() - start
+        steps_per_second = frames * number / elapsed
+        baseline = baseline or steps_per_second
+        print(f'{number:8d} {elapsed / frames * 1e6:9.1f} {steps_per_second:8.0f} {steps_per_second / baseline:8.1f}')
+
+
+def bench_pool(args):
+    with tempfile.TemporaryDirectory() as directory:
+        map_paths = []
+        for seed in range(args.maps):
+            rooms, floor = make_map(args.rooms, args.furniture, seed=seed)
+            map_paths.append(os.path.join(directory, f'map_{seed}.json'))
+            save_map(map_paths[-1], floor, rooms)
+        rng = np.random.default_rng(0)
+        print(f'{args.envs} envs on {args.maps} maps, {os.cpu_count()} cpus')
+        print(' workers  steps/s  per worker steps/s')
+        for workers in args.workers:
+            with EnvPool(map_paths, args.envs, workers, MULTIPLIER, seed=0) as pool:
+                pool.reset()
+                pool.step(np.full(args.envs, 2))  # the workers load their maps on the first command
+                frames = max(1, args.steps // args.envs)
+                start = time.perf_counter()
+                for _ in range(frames):
+                    pool.step(rng.choice([0, 1, 2, 2], size=args.envs))
+                elapsed = time.perf_counter() - start
+                stats = pool.stats()
+            assert not any(worker['tensorflow'] for worker in stats)
+            print(f'{pool.workers:8d} {frames * args.envs / elapsed:8.0f}  ' +
+                  ' '.join(f'{worker["steps_per_second"]:.0f}' for worker in stats))
+
+
+def bench_inference(args):
+    # imported here, the other benchmarks run without TensorFlow
+    from training.SLAMRobot import SLAMAgent
+    model = SLAMAgent(40, 3).model
+    numpy_model = NumpyModel(model)
+    rng = np.random.default_rng(0)
+    paths = {'predict': lambda states: model.predict(states, verbose=0),
+             'call': lambda states: model(states, training=False).numpy(),
+             'numpy': numpy_model.predict}
+    print('   batch' + ''.join(f'{name + " us":>12s}' for name in paths) + '  max difference')
+    for batch in args.batches:
+        states = [(rng.random((batch, 40, 3)).astype(np.float32),) for _ in range(args.calls)]
+        reference = paths['predict'](states[0][0])
+        difference = np.abs(numpy_model.predict(states[0][0]) - reference).max()
+        assert (numpy_model.predict(states[0][0]).argmax(axis=1) == reference.argmax(axis=1)).all()
+        timings = [time_per_call(path, states) for path in paths.values()]
+        print(f'{batch:8d}' + ''.join(f'{timing * 1e6:12.1f}' for timing in timings) + f'  {difference:.2e}')
+
+
+def episodes_to_target(agent, env, args):
+    # episodes of a Training style loop (act, remember, one replay per episode) until the mean score of the last
+    # window episodes reaches the target, None when it does not within the episodes
+    scores = []
+    for episode in range(args.episodes):
+        state, done, score = env.reset()[None], False, 0
+        while not done:
+            action, _ = agent.act(state)
+            observation, reward, done, _ = env.step(action)
+            next_state = observation[None]
+            agent.remember(state, action, reward, next_state, done)
+            state, score = next_state, score + reward
+        agent.replay(args.batch)
+        scores.append(score)
+        if len(scores) >= args.window and np.mean(scores[-args.window:]) >= args.target:
+            return episode + 1, scores
+    return None, scores
+
+
+def bench_replay(args):
+    # imported here, the other benchmarks run without TensorFlow
+    import tensorflow as tf
+    from training.SLAMRobot import SLAMAgent
+    world = World(MULTIPLIER)
+    world.rooms, world.floor = make_map(args.rooms, args.furniture)
+    print(f'target: mean score {args.target} over {args.window} episodes, at most {args.episodes} episodes')
+    print('sampler       seed  episodes  last mean score  seconds')
+    for name, prioritized in (('uniform', False), ('prioritized', True)):
+        for seed in range(args.seeds):
+            random.seed(seed)
+            tf.keras.utils.set_random_seed(seed)
+            agent = SLAMAgent(40, 3, prioritized=prioritized)
+            env = NavigationEnv(world, max_frames=args.max_frames, seed=seed)
+            start = time.perf_counter()
+            episodes, scores = episodes_to_target(agent, env, args)
+            elapsed = time.perf_counter() - start
+            reached = f'{episodes:8d}' if episodes is not None else f'{">" + str(args.episodes):>8s}'
+            print(f'{name:12s} {seed:5d}  {reached}  {np.mean(scores[-args.window:]):15.1f}  {elapsed:7.0f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulator micro benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    sensor_parser = subparsers.add_parser('sensor', help='per-ray sensor cost, brute force against the grid')
+    sensor_parser.add_argument('--rooms', type=int, default=7)
+    sensor_parser.add_argument('--furniture', type=int, nargs='+', default=[0, 25, 50, 100, 200, 400, 800, 1600])
+    sensor_parser.add_argument('--poses', type=int, default=200)
+    sensor_parser.add_argument('--field', type=int, default=None, metavar='RESOLUTION',
+                               help='also time rays sphere traced on a distance field of this resolution')
+    sensor_parser.set_defaults(run=bench_sensor)
+    model_parser = subparsers.add_parser('sensor-model', help='cost and error of fewer or more rays, against the '
+                                                              'default sensor')
+    model_parser.add_argument('--rooms', type=int, default=7)
+    model_parser.add_argument('--furniture', type=int, nargs='+', default=[0, 100, 400, 1600])
+    model_parser.add_argument('--poses', type=int, default=200)
+    model_parser.add_argument('--ray-counts', type=int, nargs='+', default=[20, 40, 80])
+    model_parser.set_defaults(run=bench_sensor_model)
+    parity_parser = subparsers.add_parser('parity', help='observations of the sensor, brute force and grid, checked '
+                                                         'bit for bit against the scalar caster; fails on any '
+                                                         'mismatch')
+    parity_parser.add_argument('--rooms', type=int, default=4)
+    parity_parser.add_argument('--furniture', type=int, default=40)
+    parity_parser.add_argument('--poses', type=int, default=200)
+    parity_parser.add_argument('--seeds', type=int, default=5)
+    parity_parser.set_defaults(run=bench_parity)
+    obstacles_parser = subparsers.add_parser('obstacles', help='agent sized collision queries, linear scan against '
+                                                               'the obstacle hash')
+    obstacles_parser.add_argument('--rooms', type=int, default=7)
+    obstacles_parser.add_argument('--furniture', type=int, nargs='+', default=[0, 25, 50, 100, 200, 400, 800, 1600])
+    obstacles_parser.add_argument('--queries', type=int, default=2000)
+    obstacles_parser.set_defaults(run=bench_obstacles)
+    geometry_parser = subparsers.add_parser('geometry', help='geometry kernels of every installed backend, '
+                                                             'checked bit for bit against numpy')
+    geometry_parser.add_argument('--pairs', type=int, default=1000000)
+    geometry_parser.add_argument('--rays', type=int, default=2000)
+    geometry_parser.add_argument('--segments', type=int, default=500)
+    geometry_parser.add_argument('--furniture', type=int, default=200)
+    geometry_parser.set_defaults(run=bench_geometry)
+    env_parser = subparsers.add_parser('env', help='reset/step throughput of the navigation env, random actions')
+    env_parser.add_argument('--rooms', type=int, default=7)
+    env_parser.add_argument('--furniture', type=int, nargs='+', default=[0, 100, 400])
+    env_parser.add_argument('--steps', type=int, default=5000)
+    env_parser.set_defaults(run=bench_env)
+    vector_env_parser = subparsers.add_parser('vector-env', help='lockstep throughput of N navigation envs on one '
+                                                                 'map, random actions')
+    vector_env_parser.add_argument('--rooms', type=int, default=7)
+    vector_env_parser.add_argument('--furniture', type=int, default=100)
+    vector_env_parser.add_argument('--envs', type=int, nargs='+', default=[1, 4, 16, 64, 256])
+    vector_env_parser.add_argument('--steps', type=int, default=20000)
+    vector_env_parser.set_defaults(run=bench_vector_env)
+    pool_parser = subparsers.add_parser('pool', help='throughput of the navigation envs sharded over worker '
+                                                     'processes, with the steps per second of each worker')
+    pool_parser.add_argument('--rooms', type=int, default=7)
+    pool_parser.add_argument('--furniture', type=int, default=100)
+    pool_parser.add_argument('--maps', type=int, default=2)
+    pool_parser.add_argument('--envs', type=int, default=64)
+    pool_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    pool_parser.add_argument('--steps', type=int, default=20000)
+    pool_parser.set_defaults(run=bench_pool)
+    inference_parser = subparsers.add_parser('inference', help='latency of the agent network: model.predict, '
+                                                               'a direct model call and the NumPy forward pass')
+    inference_parser.add_argument('--batches', type=int, nargs='+', default=[1, 4, 16, 64])
+    inference_parser.add_argument('--calls', type=int, default=200)
+    inference_parser.set_defaults(run=bench_inference)
+    replay_parser = subparsers.add_parser('replay', help='episodes of training to a target score, uniform against '
+                                                         'prioritized replay')
+    replay_parser.add_argument('--rooms', type=int, default=4)
+    replay_parser.add_argument('--furniture', type=int, default=60)
+    replay_parser.add_argument('--episodes', type=int, default=500)
+    replay_parser.add_argument('--max-frames', type=int, default=None)
+    replay_parser.add_argument('--target', type=float, default=50)
+    replay_parser.add_argument('--window', type=int, default=20)
+    replay_parser.add_argument('--batch', type=int, default=100)
+    replay_parser.add_argument('--seeds', type=int, default=3)
+    replay_parser.set_defaults(run=bench_replay)
+    arguments = parser.parse_args()
+    arguments.run(arguments)
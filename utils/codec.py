@@ -0,0 +1,77 @@
+import numpy as np
+
+# bytes of a record per distance precision, see ObservationCodec
+DISTANCE_TYPES = dict(exact=np.uint16, float16=np.float16, uint8=np.uint8)
+
+
+class ObservationCodec:
+    """Compact records of the (rays, 3) observations of a sensor, for the replay memory.
+
+    The angle channel only depends on the heading, which is stored once, the objective flags are packed as bits
+    and the distances are stored with the given precision:
+    - 'exact': the squared distance in pixels as uint16. Hits are integer points seen from an integer eye point,
+      so the squared distance is an integer and the decoded observation is the network input bit for bit. Only
+      for sensors that cast every ray exactly (no resampling or sphere tracing) up to 253 pixels.
+    - 'float16': the normalized distance as float16, about 3 significant digits.
+    - 'uint8': the normalized distance in 1/255 steps, clipped to [0, 1].
+    - 'auto': 'exact' when the sensor allows it, 'float16' otherwise.
+    A record of the 40 rays takes 87 bytes with 'exact' and 'float16' and 47 with 'uint8', instead of 960."""
+
+    def __init__(self, sensor, precision='exact'):
+        if precision not in DISTANCE_TYPES and precision != 'auto':
+            raise ValueError(f"unknown precision {precision!r}, expected one of {sorted(DISTANCE_TYPES)} or 'auto'")
+        exact = sensor.exact_distances and (sensor.max_range + 2) ** 2 <= np.iinfo(np.uint16).max
+        if precision == 'auto':
+            precision = 'exact' if exact else 'float16'
+        if precision == 'exact' and not sensor.exact_distances:
+            raise ValueError("the sensor interpolates or traces its distances, 'exact' cannot store them")
+        if precision == 'exact' and not exact:
+            raise ValueError(f"squared distances up to {sensor.max_range} pixels do not fit 'exact' records")
+        self.precision = precision
+        self.rays = sensor.output_rays
+        self._max_range = sensor.max_range
+        self.dtype = np.dtype([('heading', np.uint16), ('distances', DISTANCE_TYPES[precision], (self.rays,)),
+                               ('flags', np.uint8, ((self.rays + 7) // 8,))])
+        # angle channel of every integer heading, the first angle tells them apart
+        self._angles = np.stack([sensor.output_angles(rot) for rot in range(360)])
+        self._headings = {angle: rot for rot, angle in enumerate(self._angles[:, 0].tolist())}
+
+    def empty(self, size):
+        return np.zeros(size, dtype=self.dtype)
+
+    def encode(self, observation):
+        """The record of a (rays, 3) observation. Raises ValueError when the angle channel is not the one of an
+        integer heading, or when 'exact' cannot store the distances exactly."""
+        observation = np.asarray(observation, dtype=np.float64).reshape(self.rays, 3)
+        rot = self._headings.get(observation[0, 0])
+        if rot is None or not np.array_equal(self._angles[rot], observation[:, 0]):
+            raise ValueError('the angle channel is not the one of an integer heading of the sensor')
+        record = self.empty(())
+        record['heading'] = rot
+        distances = observation[:, 1]
+        if self.precision == 'exact':
+            squared = np.rint(np.square(distances * self._max_range))
+            if not np.array_equal(np.sqrt(squared) / self._max_range, distances):
+                raise ValueError("the distances are not the ones of integer hit points, use 'float16' or 'uint8'")
+            record['distances'] = squared
+        elif self.precision == 'float16':
+            record['distances'] = distances
+        else:
+            record['distances'] = np.rint(np.clip(distances, 0, 1) * 255)
+        record['flags'] = np.packbits(observation[:, 2] != 0)
+        return record
+
+    def decode(self, records):
+        """The (..., rays, 3) float64 observations of the records, as the network takes them."""
+        records = np.asarray(records, dtype=self.dtype)
+        observations = np.empty(records.shape + (self.rays, 3))
+        observations[..., 0] = self._angles[records['heading']]
+        distances = records['distances'].astype(np.float64)
+        if self.precision == 'exact':
+            observations[..., 1] = np.sqrt(distances) / self._max_range
+        elif self.precision == 'float16':
+            observations[..., 1] = distances
+        else:
+            observations[..., 1] = distances / 255
+        observations[..., 2] = np.unpackbits(records['flags'], axis=-1, count=self.rays)
+        return observations
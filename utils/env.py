@@ -0,0 +1,212 @@
+import random
+
+import numpy as np
+
+from utils.maps import load_map
+from utils.state import WorldState, step, observe
+from utils.world import World
+
+ACTION_NUMBER = 3  # 0 turns left, 1 turns right, 2 moves forward
+START_ROT = 90
+START_DIST_TO_OBJECTIVE = 1000
+
+
+def episode_frames(world):
+    """Frames of an episode on the map of world, computed as Training.training_setup does."""
+    room_number = len(world.rooms)
+    env_width = world.floor.width + (8 * room_number * world.multiplier)
+    env_height = world.floor.height + (8 * room_number * world.multiplier)
+    return int((100 * room_number) + 0.005 * (env_width * env_height))
+
+
+def load_world(file_path, multiplier, sensor=None):
+    """A compiled World holding the map saved in file_path."""
+    world = World(multiplier)
+    world.floor, world.rooms = load_map(file_path)
+    world.doors = [room.door for room in world.rooms]
+    if sensor is not None:
+        world.use_sensor(sensor)
+    world.compile()
+    return world
+
+
+class NavigationEnv:
+    """reset() -> observation and step(action) -> observation, reward, done, info over the map of a World.
+
+    Rewards are those of Training.make_reward. A reached objective moves to a new free position before the next
+    observation is taken, and an episode ends on a collision or after max_frames frames. Only the geometry of
+    the World is used, so the World an Environment or a Training shares can be passed as well as a map file."""
+
+    def __init__(self, world, speed=2, max_frames=None, seed=None):
+        self.world = world
+        if self.world.segments is None:
+            self.world.compile()
+        self.speed = speed
+        self.max_frames = episode_frames(world) if max_frames is None else max_frames
+        self.rng = random.Random(seed)
+        self.state = None
+        self._done = True
+
+    @classmethod
+    def from_map(cls, file_path, multiplier, sensor=None, **kwargs):
+        return cls(load_world(file_path, multiplier, sensor), **kwargs)
+
+    @property
+    def agent_size(self):
+        return self.world.agent.width, self.world.agent.height
+
+    @property
+    def objective_size(self):
+        return self.world.objective.width, self.world.objective.height
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng.seed(seed)
+        free_space, rooms = self.world.segments.free_space, self.world.segments.rooms
+        # drawn in the order of Training.run_training
+        objective_x, objective_y = free_space.sample_objective(*self.objective_size, rng=self.rng)
+        agent_x, agent_y = free_space.sample_agent(*self.agent_size, rng=self.rng)
+        self.state = WorldState(agent_x=agent_x, agent_y=agent_y, rot=START_ROT,
+                                last_room=rooms.room_at(agent_x, agent_y), objective_x=objective_x,
+                                objective_y=objective_y, dist_to_objective=START_DIST_TO_OBJECTIVE)
+        self._done = False
+        return self.observe()
+
+    def observe(self):
+        observations, _ = observe(self.state, self.world.segments, self.world.sensor, self.agent_size,
+                                  self.objective_size)
+        return observations[0]
+
+    def step(self, action):
+        if self._done:
+            raise RuntimeError('step() called on a finished episode, reset() first')
+        table = self.world.segments
+        state, observations, rewards, terminals = step(self.state, action, table, self.world.sensor, self.speed,
+                                                       self.max_frames, self.agent_size, self.objective_size)
+        reached = bool(state.score[0] > self.state.score[0])
+        room_changed = bool(state.last_room[0] != self.state.last_room[0])
+        self.state = state
+        if reached:
+            state.objective_x[0], state.objective_y[0] = table.free_space.sample_objective(*self.objective_size,
+                                                                                           rng=self.rng)
+            observation = self.observe()
+        else:
+            observation = observations[0]
+        self._done = bool(terminals[0])
+        info = dict(frame_count=state.frame_count[0].item(), score=state.score[0].item(), reached=reached,
+                    room_changed=room_changed, collision=None)
+        if self._done:
+            info['collision'] = table.collision(tuple(state.agent_rects(self.agent_size)[0].tolist()))
+        return observation, rewards[0].item(), self._done, info
+
+
+class VectorNavigationEnv:
+    """number NavigationEnv episodes played in lockstep, on one World or spread round robin over several.
+
+    The episodes are the rows of one WorldState: a frame moves, collides, senses and rewards all the episodes of a
+    map in a single batched step(), so the policy can be asked for every action at once. Finished episodes are
+    reset in place and the batch stays full. step(actions) returns the (number, rays, 3) observations, the
+    rewards, the done flags and an info dict of arrays, where final_observations are the observations before the
+    reset of the episodes that just ended.
+
+    The spawn and objective positions of all the episodes that reset, or reach their objective, in a frame are
+    drawn at once per map with FreeSpace.sample_many, from a NumPy Generator: they follow the distribution of
+    NavigationEnv but not its random sequence."""
+
+    def __init__(self, worlds, number, speed=2, max_frames=None, seed=None):
+        self.worlds = list(worlds) if isinstance(worlds, (list, tuple)) else [worlds]
+        for world in self.worlds:
+            if world.segments is None:
+                world.compile()
+        self.number = number
+        self.speed = speed
+        self.map_index = np.arange(number) % len(self.worlds)
+        self.max_frames = np.array([episode_frames(world) if max_frames is None else max_frames
+                                    for world in self.worlds])[self.map_index]
+        self.rng = np.random.default_rng(seed)
+        self.state = WorldState(number)
+        self.episodes = 0
+
+    @classmethod
+    def from_maps(cls, file_paths, multiplier, number, sensor=None, **kwargs):
+        return cls([load_world(file_path, multiplier, sensor) for file_path in file_paths], number, **kwargs)
+
+    def _groups(self, indexes):
+        # positions in indexes of the episodes of each map
+        for world_index, world in enumerate(self.worlds):
+            positions = np.flatnonzero(self.map_index[indexes] == world_index)
+            if len(positions):
+                yield world, positions
+
+    @staticmethod
+    def _sizes(world):
+        return (world.agent.width, world.agent.height), (world.objective.width, world.objective.height)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        indexes = np.arange(self.number)
+        self._reset(indexes)
+        return self.observe(indexes)
+
+    def _reset(self, indexes):
+        states = WorldState(len(indexes), rot=START_ROT, dist_to_objective=START_DIST_TO_OBJECTIVE)
+        for world, positions in self._groups(indexes):
+            agent_size, objective_size = self._sizes(world)
+            free_space = world.segments.free_space
+            objectives = free_space.sample_many(*objective_size, 'objective', len(positions), self.rng)
+            agents = free_space.sample_many(*agent_size, 'agent', len(positions), self.rng)
+            states.objective_x[positions], states.objective_y[positions] = objectives.T
+            states.agent_x[positions], states.agent_y[positions] = agents.T
+            states.last_room[positions] = world.segments.rooms.rooms_at(*agents.T)
+        self.state.put(indexes, states)
+
+    def observe(self, indexes=None):
+        """Observations of the episodes selected by indexes, all of them by default."""
+        indexes = np.arange(self.number) if indexes is None else np.asarray(indexes)
+        observations = None
+        for world, positions in self._groups(indexes):
+            group_observations, _ = observe(self.state.take(indexes[positions]), world.segments, world.sensor,
+                                            *self._sizes(world))
+            if observations is None:
+                observations = np.empty((len(indexes),) + group_observations.shape[1:])
+            observations[positions] = group_observations
+        return observations
+
+    def step(self, actions):
+        actions = np.broadcast_to(np.asarray(actions), (self.number,))
+        next_state = WorldState(self.number)
+        observations = rewards = None
+        terminals = np.empty(self.number, dtype=bool)
+        for world, group in self._groups(np.arange(self.number)):
+            group_state, group_observations, group_rewards, terminals[group] = step(
+                self.state.take(group), actions[group], world.segments, world.sensor, self.speed, None,
+                *self._sizes(world))
+            if observations is None:
+                observations = np.empty((self.number,) + group_observations.shape[1:])
+                rewards = np.empty(self.number, dtype=group_rewards.dtype)
+            next_state.put(group, group_state)
+            observations[group], rewards[group] = group_observations, group_rewards
+        collided = terminals.copy()
+        dones = terminals | (next_state.frame_count > self.max_frames)
+        reached = next_state.score > self.state.score
+        room_changed = next_state.last_room != self.state.last_room
+        self.state = next_state
+
+        reached_indexes = np.flatnonzero(reached)
+        for world, positions in self._groups(reached_indexes):
+            objectives = world.segments.free_space.sample_many(*self._sizes(world)[1], 'objective', len(positions),
+                                                               self.rng)
+            next_state.objective_x[reached_indexes[positions]], next_state.objective_y[reached_indexes[positions]] = \
+                objectives.T
+        if len(reached_indexes):
+            observations[reached_indexes] = self.observe(reached_indexes)
+        info = dict(frame_count=next_state.frame_count.copy(), score=next_state.score.copy(), reached=reached,
+                    room_changed=room_changed, collided=collided, final_observations=observations.copy())
+
+        done_indexes = np.flatnonzero(dones)
+        if len(done_indexes):
+            self._reset(done_indexes)
+            observations[done_indexes] = self.observe(done_indexes)
+            self.episodes += len(done_indexes)
+        return observations, rewards, dones, info
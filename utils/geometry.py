@@ -0,0 +1,151 @@
+import math
+import numpy as np
+from utils.utils import check_lines_collision
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+DEFAULT_BACKEND = 'numpy'
+
+
+class NumpyGeometry:
+    """Vectorized geometry kernels, every argument broadcasts like a NumPy ufunc."""
+    name = 'numpy'
+
+    def lines_collision(self, x1, y1, x2, y2, x3, y3, x4, y4):
+        """Truncated intersection coordinates of the segments (x1, y1, x2, y2) and (x3, y3, x4, y4) and the hit mask."""
+        return check_lines_collision(x1, y1, x2, y2, x3, y3, x4, y4)
+
+    def hit_distances(self, x1, y1, x2, y2, x3, y3, x4, y4):
+        """Distance from (x1, y1) to the truncated intersection of the two segments, inf when they do not cross."""
+        px, py, hit = check_lines_collision(x1, y1, x2, y2, x3, y3, x4, y4)
+        return np.where(hit, np.sqrt((x1 - px) ** 2 + (y1 - py) ** 2), np.inf)
+
+    def nearest_hits(self, rays, segments):
+        """Distance of the closest hit of every ray (R, 4) among all the segments (S, 4), inf when nothing is hit."""
+        distances = self.hit_distances(*(rays[:, i, None] for i in range(4)), *(segments[None, :, i] for i in range(4)))
+        return distances.min(axis=1, initial=np.inf)
+
+    def point_distances(self, x1, y1, x2, y2):
+        """Element-wise Check_Collisions.point_point_distance."""
+        return np.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+
+    def rects_contain_points(self, x, y, width, height, px, py):
+        """Element-wise Check_Collisions.check_rect_contains_point, edges included."""
+        return (x <= px) & (px <= x + width) & (y <= py) & (py <= y + height)
+
+
+def _numba_kernels():
+    # compiled on first use only, numba is optional and compiling takes a couple of seconds
+    def ratio(numerator, denominator):
+        # numpy semantics for a null denominator, numba would raise like plain python
+        if denominator != 0.0:
+            return numerator / denominator
+        if numerator != 0.0 and not math.isnan(numerator):
+            return math.copysign(math.inf, numerator) * math.copysign(1.0, denominator)
+        return math.nan
+
+    ratio = numba.njit(inline='always')(ratio)
+
+    def intersection(x1, y1, x2, y2, x3, y3, x4, y4):
+        # same operations, in the same order, as check_lines_collision
+        dx1, dy1, dx2, dy2 = x2 - x1, y2 - y1, x4 - x3, y4 - y3
+        ox, oy = x1 - x3, y1 - y3
+        denominator = dy2 * dx1 - dx2 * dy1
+        u_a = ratio(dx2 * oy - dy2 * ox, denominator)
+        u_b = ratio(dx1 * oy - dy1 * ox, denominator)
+        hit = 0 <= u_a <= 1 and 0 <= u_b <= 1
+        return np.trunc(x1 + (u_a * dx1)), np.trunc(y1 + (u_a * dy1)), hit
+
+    intersection = numba.njit(inline='always')(intersection)
+
+    @numba.guvectorize(['void(f8, f8, f8, f8, f8, f8, f8, f8, f8[:], f8[:], b1[:])'],
+                       '(),(),(),(),(),(),(),()->(),(),()', nopython=True)
+    def lines_collision(x1, y1, x2, y2, x3, y3, x4, y4, px, py, hit):
+        px[0], py[0], hit[0] = intersection(x1, y1, x2, y2, x3, y3, x4, y4)
+
+    def hit_distance(x1, y1, x2, y2, x3, y3, x4, y4):
+        px, py, hit = intersection(x1, y1, x2, y2, x3, y3, x4, y4)
+        return math.sqrt((x1 - px) ** 2 + (y1 - py) ** 2) if hit else math.inf
+
+    hit_distance = numba.njit(inline='always')(hit_distance)
+
+    @numba.vectorize(['f8(f8, f8, f8, f8, f8, f8, f8, f8)'], nopython=True)
+    def hit_distances(x1, y1, x2, y2, x3, y3, x4, y4):
+        return hit_distance(x1, y1, x2, y2, x3, y3, x4, y4)
+
+    @numba.njit
+    def nearest_hits(rays, segments):
+        distances = np.full(rays.shape[0], math.inf)
+        for i in range(rays.shape[0]):
+            for j in range(segments.shape[0]):
+                distance = hit_distance(rays[i, 0], rays[i, 1], rays[i, 2], rays[i, 3],
+                                        segments[j, 0], segments[j, 1], segments[j, 2], segments[j, 3])
+                if distance < distances[i]:
+                    distances[i] = distance
+        return distances
+
+    @numba.vectorize(['f8(f8, f8, f8, f8)'], nopython=True)
+    def point_distances(x1, y1, x2, y2):
+        return math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+
+    @numba.vectorize(['b1(f8, f8, f8, f8, f8, f8)'], nopython=True)
+    def rects_contain_points(x, y, width, height, px, py):
+        return x <= px <= x + width and y <= py <= y + height
+
+    return lines_collision, hit_distances, nearest_hits, point_distances, rects_contain_points
+
+
+class NumbaGeometry(NumpyGeometry):
+    """The NumPy kernels compiled with numba, fused so that no temporary array is allocated per operation."""
+    name = 'numba'
+
+    def __init__(self):
+        if numba is None:
+            raise ImportError('the numba geometry backend needs numba installed')
+        (self._lines_collision, self._hit_distances, self._nearest_hits, self._point_distances,
+         self._rects_contain_points) = _numba_kernels()
+
+    def lines_collision(self, x1, y1, x2, y2, x3, y3, x4, y4):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self._lines_collision(x1, y1, x2, y2, x3, y3, x4, y4)
+
+    def hit_distances(self, x1, y1, x2, y2, x3, y3, x4, y4):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self._hit_distances(x1, y1, x2, y2, x3, y3, x4, y4)
+
+    def nearest_hits(self, rays, segments):
+        return self._nearest_hits(np.ascontiguousarray(rays, dtype=np.float64),
+                                  np.ascontiguousarray(segments, dtype=np.float64))
+
+    def point_distances(self, x1, y1, x2, y2):
+        return self._point_distances(x1, y1, x2, y2)
+
+    def rects_contain_points(self, x, y, width, height, px, py):
+        return self._rects_contain_points(x, y, width, height, px, py)
+
+
+BACKENDS = {'numpy': NumpyGeometry, 'numba': NumbaGeometry}
+_backend = NumpyGeometry()
+
+
+def available_backends():
+    return [name for name in BACKENDS if name != 'numba' or numba is not None]
+
+
+def set_backend(name):
+    """Selects the geometry kernels used by the sensor and the spatial indexes, 'auto' picks the fastest installed."""
+    global _backend
+    if name == 'auto':
+        name = 'numba' if numba is not None else DEFAULT_BACKEND
+    if name not in available_backends():
+        raise ValueError(f'unknown or not installed geometry backend {name!r}, available: {available_backends()}')
+    if _backend.name != name:
+        _backend = BACKENDS[name]()
+    return _backend
+
+
+def backend():
+    return _backend
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def _softmax(values):
+    exponentials = np.exp(values - values.max(axis=-1, keepdims=True))
+    return exponentials / exponentials.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = dict(linear=lambda values: values, relu=lambda values: np.maximum(values, 0), softmax=_softmax)
+
+
+class NumpyModel:
+    """Forward pass of a Keras Sequential made of Dense and Flatten layers, in NumPy and float32 like Keras.
+
+    For the one state and small batch calls of the agent, where model.predict costs far more than the network.
+    The weights are copies: sync() must be called again after the model is trained or loaded."""
+
+    def __init__(self, model=None):
+        self.layers = []
+        if model is not None:
+            self.sync(model)
+
+    def sync(self, model):
+        layers = []
+        for layer in model.layers:
+            kind = type(layer).__name__
+            if kind == 'Dense':
+                kernel, bias = layer.get_weights()
+                activation = layer.get_config()['activation']
+                if activation not in ACTIVATIONS:
+                    raise ValueError(f'unsupported activation {activation!r} in layer {layer.name}')
+                layers.append((kernel.astype(np.float32), bias.astype(np.float32), ACTIVATIONS[activation]))
+            elif kind == 'Flatten':
+                layers.append(None)
+            else:
+                raise ValueError(f'unsupported layer {kind} in the NumPy forward pass')
+        self.layers = layers
+
+    def predict(self, states):
+        values = np.asarray(states, dtype=np.float32)
+        for layer in self.layers:
+            if layer is None:
+                values = values.reshape(len(values), -1)
+            else:
+                kernel, bias, activation = layer
+                values = activation(values @ kernel + bias)
+        return values
@@ -0,0 +1,55 @@
+import json
+
+from utils.utils import Game_Object, Room
+
+
+def load_map(file_path):
+    """Floor and rooms of a saved map, with their door and furniture, as plain geometry: no sprite is attached,
+    a Renderer adds them when the map has to be drawn."""
+    with open(file_path, 'r') as infile:
+        environment_dict = json.loads(infile.read())
+
+    floor_dict = environment_dict["floor"]
+    floor = Game_Object(floor_dict["x"], floor_dict["y"], floor_dict["width"], floor_dict["height"], None, 'floor')
+    rooms = []
+    for i in range(0, environment_dict["roomNumber"]):
+        room_dict = environment_dict["R" + str(i)]
+        room = Room(room_dict["x"], room_dict["y"], room_dict["width"], room_dict["height"], i, None,
+                    room_dict["type"])
+        door_dict = room_dict["door"]
+        room.door = Game_Object(door_dict["x"], door_dict["y"], door_dict["width"], door_dict["height"], None, 'door')
+        for child_dict in room_dict["children"]:
+            child = _load_object(child_dict)
+            room.children.append(child)
+            for childchild_dict in child_dict["children"]:
+                child.children.append(_load_object(childchild_dict))
+        rooms.append(room)
+    return floor, rooms
+
+
+def save_map(file_path, floor, rooms):
+    """Writes the floor and the rooms in the format load_map reads."""
+    serialized_floor = dict(x=floor.x, y=floor.y, width=floor.width, height=floor.height)
+    serialized_environment = dict(roomNumber=len(rooms), floor=serialized_floor)
+    for room in rooms:
+        serialized_room = dict(x=room.x, y=room.y, width=room.width, height=room.height, type=room.type,
+                               children=[], door=dict(x=room.door.x, y=room.door.y, width=room.door.width,
+                                                      height=room.door.height))
+        for child in room.children:
+            serialized_child = dict(x=child.x, y=child.y, width=child.width, height=child.height, type=child.type,
+                                    orientation=child.orientation, children=[])
+            for ch in child.children:
+                serialized_child_child = dict(x=ch.x, y=ch.y, width=ch.width, height=ch.height, type=ch.type,
+                                              orientation=ch.orientation)
+                serialized_child["children"].append(serialized_child_child)
+            serialized_room["children"].append(serialized_child)
+        serialized_environment["R" + str(room.index)] = serialized_room
+    with open(file_path, 'w') as outfile:
+        json.dump(serialized_environment, outfile)
+
+
+def _load_object(object_dict):
+    thing = Game_Object(object_dict["x"], object_dict["y"], object_dict["width"], object_dict["height"], None,
+                        object_dict["type"])
+    thing.orientation = object_dict["orientation"]
+    return thing
@@ -0,0 +1,165 @@
+import contextlib
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils.env import VectorNavigationEnv, load_world
+from utils.sensor import RaySensor
+
+
+class SharedBuffers:
+    """Actions, observations, rewards and done flags of number environments, as NumPy arrays over shared memory
+    blocks. Created by the pool, attached to by name in the workers."""
+
+    def __init__(self, number, rays, names=None):
+        specs = dict(actions=((number,), np.int64), observations=((number, rays, 3), np.float64),
+                     rewards=((number,), np.int64), dones=((number,), np.bool_))
+        self._owner = names is None
+        self._blocks = {}
+        for name, (shape, dtype) in specs.items():
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            if self._owner:
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                block = shared_memory.SharedMemory(name=names[name])
+            self._blocks[name] = block
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+        self.names = {name: block.name for name, block in self._blocks.items()}
+
+    def close(self):
+        for name in self._blocks:
+            setattr(self, name, None)
+        for block in self._blocks.values():
+            block.close()
+            if self._owner:
+                block.unlink()
+        self._blocks = {}
+
+
+def _worker(connection, names, number, rays, start, stop, map_paths, multiplier, sensor, seed, env_kwargs):
+    # runs in a spawned process: only this module and the geometry it needs are imported
+    buffers = SharedBuffers(number, rays, names)
+    env = None
+    steps, seconds = 0, 0.0
+    try:
+        while True:
+            command = connection.recv()
+            if command == 'close':
+                break
+            try:
+                if env is None:
+                    worlds = [load_world(map_path, multiplier, sensor) for map_path in map_paths]
+                    env = VectorNavigationEnv(worlds, stop - start, seed=seed, **env_kwargs)
+                if command == 'reset':
+                    buffers.observations[start:stop] = env.reset()
+                    buffers.rewards[start:stop] = 0
+                    buffers.dones[start:stop] = False
+                    connection.send(None)
+                elif command == 'step':
+                    step_start = time.perf_counter()
+                    observations, rewards, dones, _ = env.step(buffers.actions[start:stop])
+                    buffers.observations[start:stop] = observations
+                    buffers.rewards[start:stop] = rewards
+                    buffers.dones[start:stop] = dones
+                    seconds += time.perf_counter() - step_start
+                    steps += stop - start
+                    connection.send(None)
+                elif command == 'stats':
+                    connection.send(dict(envs=stop - start, steps=steps, seconds=seconds, episodes=env.episodes,
+                                         steps_per_second=steps / seconds if seconds else 0.0,
+                                         tensorflow='tensorflow' in sys.modules))
+                else:
+                    raise ValueError(f'unknown command {command!r}')
+            except Exception as error:
+                connection.send(error)
+    finally:
+        buffers.close()
+        connection.close()
+
+
+@contextlib.contextmanager
+def _main_module_hidden():
+    # spawned processes import the module the parent runs as __main__; hidden while they start, so that a
+    # training script importing TensorFlow at the top does not load it in every worker
+    main = sys.modules['__main__']
+    saved = {name: main.__dict__[name] for name in ('__file__', '__spec__') if name in main.__dict__}
+    main.__dict__.pop('__file__', None)
+    main.__spec__ = None
+    try:
+        yield
+    finally:
+        main.__dict__.update(saved)
+
+
+class EnvPool:
+    """number navigation episodes sharded over worker processes, each stepping its shard with a VectorNavigationEnv
+    built from the map files, loaded once per worker.
+
+    Actions, observations, rewards and done flags travel through SharedBuffers, only the short commands are
+    pickled. The arrays returned by reset() and step() are views of the shared buffers, overwritten by the next
+    call. Workers are spawned and import neither the training code nor TensorFlow, stats() reports it with the
+    steps per second of each worker."""
+
+    def __init__(self, map_paths, number, workers=None, multiplier=8.5, sensor=None, seed=None, **env_kwargs):
+        sensor = RaySensor() if sensor is None else sensor
+        self.number = number
+        self.workers = max(1, min(workers or os.cpu_count() or 1, number))
+        self.buffers = SharedBuffers(number, sensor.output_rays)
+        bounds = np.linspace(0, number, self.workers + 1).astype(int).tolist()
+        self.shards = list(zip(bounds[:-1], bounds[1:]))
+        context = multiprocessing.get_context('spawn')
+        self._connections, self._processes = [], []
+        with _main_module_hidden():
+            for index, (start, stop) in enumerate(self.shards):
+                connection, worker_connection = context.Pipe()
+                process = context.Process(target=_worker, daemon=True,
+                                          args=(worker_connection, self.buffers.names, number, sensor.output_rays,
+                                                start, stop, list(map_paths), multiplier, sensor,
+                                                None if seed is None else seed + index, env_kwargs))
+                process.start()
+                worker_connection.close()
+                self._connections.append(connection)
+                self._processes.append(process)
+
+    def _broadcast(self, command):
+        for connection in self._connections:
+            connection.send(command)
+        replies = [connection.recv() for connection in self._connections]
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        return replies
+
+    def reset(self):
+        self._broadcast('reset')
+        return self.buffers.observations
+
+    def step(self, actions):
+        self.buffers.actions[:] = actions
+        self._broadcast('step')
+        return self.buffers.observations, self.buffers.rewards, self.buffers.dones
+
+    def stats(self):
+        """Steps, stepping time, steps per second and finished episodes of every worker."""
+        return [dict(worker=index, **stats) for index, stats in enumerate(self._broadcast('stats'))]
+
+    def close(self):
+        if self._processes:
+            for connection in self._connections:
+                connection.send('close')
+            for process in self._processes:
+                process.join()
+            for connection in self._connections:
+                connection.close()
+            self._connections, self._processes = [], []
+            self.buffers.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
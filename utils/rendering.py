@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import pygame
+
+TEXTURE_DIRECTORY = '../textures'
+TEXTURES = dict(hall='hall_texture.png', kitchen='kitchen_texture.png', bedroom='bedroom_texture.png',
+                bathroom='bathroom_texture.png', door='door_texture.png', toilet='toilet_texture.png',
+                shower='shower_texture.png', bed='green_bed_texture.png', bedside='bedside_texture.png',
+                sofa='sofa_texture.png', hall_table='hall_table_texture.png', table='table_texture.png',
+                chair='chair_texture.png', desk='desk_texture.png', sink='sink_texture.png',
+                wardrobe='wardrobe_texture.png', cupboard='wardrobe_texture.png', floor='floor_texture.png',
+                agent='agent_texture_mockup.png', objective='objective_texture_mockup.png')
+# rotation of a furniture texture for the orientation saved with the map, south facing textures are not rotated
+ORIENTATION_ROTATIONS = dict(W=-90, N=180, E=90)
+
+
+class Renderer:
+    """The pygame side of the simulation: window, font, textures and sprites.
+
+    Training only creates one when rendering is requested, the simulation runs on the geometry of the World alone
+    and never imports pygame."""
+
+    def __init__(self, texture_directory=TEXTURE_DIRECTORY, font_size=24):
+        pygame.init()
+        pygame.font.init()
+        self.font = pygame.font.Font(pygame.font.get_default_font(), font_size)
+        self.screen = None
+        self._texture_directory = texture_directory
+        self._textures = None
+
+    def open(self, frame_size):
+        self.screen = pygame.display.set_mode(frame_size)
+        return self.screen
+
+    def textures(self):
+        # convert_alpha needs a display mode, the window must be open before the first call
+        if self._textures is None:
+            self._textures = {kind: pygame.image.load(os.path.join(self._texture_directory, file_name)).convert_alpha()
+                              for kind, file_name in TEXTURES.items()}
+        return self._textures
+
+    def attach_sprites(self, world):
+        """Gives a sprite to the floor, the rooms with their door and furniture, the agent and the objective."""
+        textures = self.textures()
+        world.floor.sprite = self._sprite(textures['floor'], world.floor)
+        for room in world.rooms:
+            room.sprite = self._sprite(textures[room.type], room)
+            if room.door.width != 0:
+                door_image = pygame.transform.scale(pygame.transform.rotate(textures['door'], 90),
+                                                    (int(2.5 * world.multiplier), int(1.0 * world.multiplier)))
+            else:
+                door_image = pygame.transform.scale(textures['door'],
+                                                    (int(1.0 * world.multiplier), int(2.5 * world.multiplier)))
+            room.door.sprite = self._sprite(door_image, room.door, scaled=False)
+            for child in room.children:
+                child.sprite = self._furniture_sprite(textures, child)
+                for childchild in child.children:
+                    childchild.sprite = self._furniture_sprite(textures, childchild)
+        world.agent.sprite = self._sprite(textures['agent'], world.agent)
+        world.agent.image = world.agent.sprite.image
+        world.objective.sprite = self._sprite(textures['objective'], world.objective)
+
+    def _furniture_sprite(self, textures, thing):
+        rotation = ORIENTATION_ROTATIONS.get(thing.orientation, 0)
+        return self._sprite(pygame.transform.rotate(textures[thing.type], rotation), thing)
+
+    @staticmethod
+    def _sprite(image, thing, scaled=True):
+        sprite = pygame.sprite.Sprite()
+        sprite.image = pygame.transform.scale(image, (int(thing.width), int(thing.height))) if scaled else image
+        sprite.rect = pygame.Rect(thing.x, thing.y, thing.width, thing.height)
+        return sprite
+
+    @staticmethod
+    def present():
+        pygame.display.update()
+
+    def user_quit(self, slam_agent=None):
+        """Handles the window events: 's' saves the agent weights, closing the window quits pygame and returns True."""
+        if not pygame.display.get_init():
+            # the window was closed elsewhere, e.g. by Environment.display_environment
+            return False
+        for event in pygame.event.get():
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_s and slam_agent is not None:
+                    slam_agent.save("test")
+            if event.type == pygame.QUIT:
+                self.close()
+                return True
+        return False
+
+    def frame(self, text=None):
+        """The window content as an RGB (height, width, 3) array, with text written in the top left corner."""
+        if text is not None:
+            self.screen.blit(self.font.render(text, True, (255, 255, 255)), (10, 10))
+        return np.transpose(pygame.surfarray.array3d(self.screen), (1, 0, 2))
+
+    def close(self):
+        pygame.display.quit()
+        pygame.quit()
+        self.screen = None
+        self._textures = None
@@ -0,0 +1,186 @@
+from collections import deque
+
+import numpy as np
+
+
+class ReplayBuffer:
+    """Replay memory of (state, action, reward, next_state, terminal) transitions in preallocated arrays used as
+    rings: inserting is O(1) and sampling draws indexes.
+
+    Observations are stored once in their own ring and transitions refer to them by index, so a next state that
+    is the state of the following transition is not stored twice. Every transition costs at most two slots, the
+    observation ring holds twice the transitions and a live transition never refers to an overwritten slot.
+
+    Transitions added with priority (the nonzero rewards of SLAMAgent) are also queued, up to priority_size of
+    them: the next sample() returns all the queued ones and fills the batch uniformly with the others, as the
+    temp_memory of the agent did. A queued transition overwritten by the ring leaves the queue. priority_size=0
+    samples uniformly only.
+
+    With an ObservationCodec the observations are stored as its compact records and decoded when sampled."""
+
+    def __init__(self, capacity, observation_shape, priority_size=200, seed=None, codec=None):
+        self.capacity = capacity
+        self.observation_shape = tuple(observation_shape)
+        self.codec = codec
+        if codec is None:
+            self.observations = np.zeros((2 * capacity + 1,) + self.observation_shape, dtype=np.float64)
+        else:
+            self.observations = codec.empty(2 * capacity + 1)
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float64)
+        self.terminals = np.zeros(capacity, dtype=bool)
+        self.priority = deque(maxlen=priority_size)
+        # whether each transition is in the priority queue
+        self._queued = np.zeros(capacity, dtype=bool)
+        self.rng = np.random.default_rng(seed)
+        self._size = 0
+        self._position = 0
+        self._observation_position = 0
+        self._last_observation = None
+
+    def __len__(self):
+        return self._size
+
+    def _store(self, observation):
+        # the last stored observation is shared when given again
+        observation = np.reshape(observation, self.observation_shape)
+        if self.codec is not None:
+            observation = self.codec.encode(observation)
+        if self._last_observation is not None and \
+                self.observations[self._last_observation].tobytes() == observation.tobytes():
+            return self._last_observation
+        index = self._observation_position
+        self.observations[index] = observation
+        self._observation_position = (index + 1) % len(self.observations)
+        self._last_observation = index
+        return index
+
+    def add(self, state, action, reward, next_state, terminal, priority=False):
+        """Stores a transition, overwriting the oldest one when full. Returns its index."""
+        index = self._position
+        if self._queued[index]:
+            self.priority.remove(index)
+            self._queued[index] = False
+        self.states[index] = self._store(state)
+        self.next_states[index] = self._store(next_state)
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.terminals[index] = terminal
+        self._position = (index + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        if priority and self.priority.maxlen:
+            if len(self.priority) == self.priority.maxlen:
+                self._queued[self.priority[0]] = False
+            self.priority.append(index)
+            self._queued[index] = True
+        return index
+
+    def sample_indexes(self, batch_size):
+        """The queued priority transitions, then uniform draws without replacement among the other ones up to
+        batch_size, or up to the size of the memory when it is not larger than batch_size. The queue is emptied."""
+        queued = np.array(self.priority, dtype=np.int64)
+        self.priority.clear()
+        self._queued[queued] = False
+        if self._size > batch_size:
+            count = batch_size - len(queued)
+        else:
+            count = self._size - len(queued)
+        # ranks among the transitions that are not queued, shifted past the queued indexes below them
+        drawn = self.rng.choice(self._size - len(queued), size=max(count, 0), replace=False)
+        skipped = np.sort(queued)
+        drawn += np.searchsorted(skipped - np.arange(len(skipped)), drawn, side='right')
+        return np.concatenate([queued, drawn])
+
+    def batch(self, indexes):
+        """States, actions, rewards, next states and terminal flags of the transitions at indexes."""
+        states, next_states = self.observations[self.states[indexes]], self.observations[self.next_states[indexes]]
+        if self.codec is not None:
+            states, next_states = self.codec.decode(states), self.codec.decode(next_states)
+        return states, self.actions[indexes], self.rewards[indexes], next_states, self.terminals[indexes]
+
+    def sample(self, batch_size):
+        return self.batch(self.sample_indexes(batch_size))
+
+
+class SumTree:
+    """Binary tree over capacity nonnegative priorities where every node holds the sum of its children: updates
+    and prefix sum searches cost O(log capacity), both are vectorized over batches of leaves."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._depth = max(capacity - 1, 0).bit_length()
+        self._leaves = 1 << self._depth
+        self._tree = np.zeros(2 * self._leaves, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self._tree[1]
+
+    def priorities(self, indexes):
+        return self._tree[self._leaves + np.asarray(indexes, dtype=np.int64)]
+
+    def update(self, indexes, priorities):
+        nodes = self._leaves + np.asarray(indexes, dtype=np.int64)
+        self._tree[nodes] = priorities
+        for _ in range(self._depth):
+            nodes = np.unique(nodes // 2)
+            self._tree[nodes] = self._tree[2 * nodes] + self._tree[2 * nodes + 1]
+
+    def find(self, values):
+        """Leaf of every value in [0, total): the first one whose prefix sum of priorities exceeds it."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self._depth):
+            left = self._tree[2 * nodes]
+            right = values >= left
+            values -= np.where(right, left, 0)
+            nodes = 2 * nodes + right
+        return nodes - self._leaves
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """ReplayBuffer sampled in proportion to priority ** alpha, the priority of a transition being its last
+    absolute TD error plus epsilon (Schaul et al., Prioritized Experience Replay).
+
+    New transitions get the largest priority seen so far, so every one is replayed at least once, which replaces
+    the queue of nonzero reward transitions: the priority flag of add() is ignored. weights() are the importance
+    sampling weights of the sampled transitions, with beta annealed from its initial value to 1 over beta_steps
+    samples, and update_priorities() takes the TD errors computed on them."""
+
+    def __init__(self, capacity, observation_shape, alpha=0.6, beta=0.4, beta_steps=5000, epsilon=1e-3, seed=None,
+                 codec=None):
+        super().__init__(capacity, observation_shape, 0, seed, codec)
+        self.tree = SumTree(capacity)
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self._beta_increment = (1 - beta) / beta_steps if beta_steps else 0
+        self._max_priority = 1.0
+
+    def add(self, state, action, reward, next_state, terminal, priority=False):
+        index = super().add(state, action, reward, next_state, terminal)
+        self.tree.update([index], [self._max_priority])
+        return index
+
+    def sample_indexes(self, batch_size):
+        """min(batch_size, len(self)) draws with replacement, one in each of as many equal slices of the total
+        priority."""
+        count = min(batch_size, self._size)
+        segment = self.tree.total / max(count, 1)
+        values = (np.arange(count) + self.rng.random(count)) * segment
+        self.beta = min(1.0, self.beta + self._beta_increment)
+        # rounding can walk past the last stored transition
+        return np.minimum(self.tree.find(values), self._size - 1)
+
+    def weights(self, indexes):
+        """Importance sampling weights of the transitions at indexes, normalized by the largest one."""
+        probabilities = self.tree.priorities(indexes) / self.tree.total
+        weights = (self._size * probabilities) ** -self.beta
+        return weights / weights.max()
+
+    def update_priorities(self, indexes, td_errors):
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.tree.update(indexes, priorities)
+        self._max_priority = max(self._max_priority, priorities.max(initial=0))
@@ -0,0 +1,601 @@
+import hashlib
+import math
+import os
+from collections import OrderedDict
+import numpy as np
+from utils import geometry
+from utils.spatial import SegmentGrid, DistanceField, ObstacleHash, RoomRaster, FreeSpace, DoorIndex
+
+ANGLE_RANGE = 120
+STEP = 3
+MAX_RANGE = 220
+# entries of the observation the network is trained on, whatever the number of rays actually cast
+OUTPUT_RAYS = 40
+# below this many static segments testing all of them at once is faster than walking the grid
+GRID_MIN_SEGMENTS = 300
+# ray/segment pairs tested at once when many poses are cast together
+BATCH_SIZE = 2 ** 22
+
+
+def rect_segments(rect):
+    # West, North, Est, South: same edge order as Check_Collisions.check_line_rect_collision
+    x, y, width, height = rect
+    return [(x, y, x, y + height),
+            (x, y + height, x + width, y + height),
+            (x + width, y + height, x + width, y),
+            (x, y, x + width, y)]
+
+
+def check_rays_segments_collision(rays, segments):
+    """Vectorized check_line_line_collision of every ray (R, 4) against every segment (S, 4).
+
+    Returns the truncated intersection coordinates (R, S) and the hit mask (R, S)."""
+    return geometry.backend().lines_collision(*(rays[:, i, None] for i in range(4)),
+                                              *(segments[None, :, i] for i in range(4)))
+
+
+def game_object_rect(game_object):
+    # same truncation as the pygame.Rect built from the object when it is loaded
+    return int(game_object.x), int(game_object.y), int(game_object.width), int(game_object.height)
+
+
+def door_opening(door, multiplier):
+    # the door is drawn one meter thick across the wall it belongs to
+    if door.width == 0:
+        return door.x - 0.5 * multiplier, door.y, 1.0 * multiplier, door.height
+    return door.x, door.y - 0.5 * multiplier, door.width, 1.0 * multiplier
+
+
+def cut_segment(segment, rect):
+    """Removes from an axis aligned segment the part lying inside rect, returns the remaining pieces."""
+    x3, y3, x4, y4 = segment
+    x, y, width, height = rect
+    if x3 == x4 and x <= x3 <= x + width:
+        low, high = sorted((y3, y4))
+        pieces = [(low, min(high, y)), (max(low, y + height), high)]
+        return [(x3, a, x3, b) for a, b in pieces if b > a]
+    if y3 == y4 and y <= y3 <= y + height:
+        low, high = sorted((x3, x4))
+        pieces = [(low, min(high, x)), (max(low, x + width), high)]
+        return [(a, y3, b, y3) for a, b in pieces if b > a]
+    return [segment]
+
+
+def reaches(segment, rect, right_edge=False):
+    # whether rect may contain a truncated hit point of the segment: points within a pixel below its ends, rect
+    # edges from x to x + width, the right and bottom ones included when right_edge is set
+    x3, y3, x4, y4 = segment
+    x, y, width, height = rect
+    if right_edge:
+        return x <= max(x3, x4) and min(x3, x4) - 1 <= x + width and y <= max(y3, y4) and min(y3, y4) - 1 <= y + height
+    return x <= max(x3, x4) and min(x3, x4) - 1 < x + width and y <= max(y3, y4) and min(y3, y4) - 1 < y + height
+
+
+class Walls:
+    """The room walls a door opening reaches, and the floor outline when a room reaches it, cast the way
+    Environment.project_segments did: as whole segments, dropping the hits it dropped.
+
+    A wall hit is dropped when its truncated point lies in the door of the room, right and bottom edges excluded
+    like pygame.Rect.collidepoint. Only the nearest hit of the floor outline counts, dropped when a room contains
+    it, edges included like Check_Collisions.check_rect_contains_point. Walls and floor edges no rect reaches are
+    plain static segments. door_rects has the door of every wall, floor_segments is empty when no room reaches
+    the floor outline."""
+
+    def __init__(self, segments, door_rects, floor_segments, room_rects):
+        self.segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        self.doors = np.asarray(door_rects, dtype=np.float64).reshape(-1, 4)
+        self.floor = np.asarray(floor_segments, dtype=np.float64).reshape(-1, 4)
+        self.room_rects = np.asarray(room_rects, dtype=np.float64).reshape(-1, 4)
+        # the walls then the floor outline, cast in one call, and the bounds of the rects dropping their hits
+        self._columns = [column[None] for column in np.concatenate([self.segments, self.floor]).T]
+        x, y, width, height = self.doors.T
+        self._door_bounds = x, y, x + width, y + height
+        x, y, width, height = self.room_rects.T
+        self._room_bounds = x, y, x + width, y + height
+
+    def __len__(self):
+        return len(self.segments) + len(self.floor)
+
+    def nearest_hits(self, rays):
+        """Distance of the closest hit of every ray (R, 4), inf when nothing is hit."""
+        walls = len(self.segments)
+        eye_x, eye_y = rays[:, 0, None], rays[:, 1, None]
+        with np.errstate(invalid='ignore'):
+            px, py, hit = geometry.backend().lines_collision(eye_x, eye_y, rays[:, 2, None], rays[:, 3, None],
+                                                             *self._columns)
+            distances = np.where(hit, geometry.backend().point_distances(eye_x, eye_y, px, py), np.inf)
+        x_min, y_min, x_max, y_max = self._door_bounds
+        wall_x, wall_y = px[:, :walls], py[:, :walls]
+        in_door = (x_min <= wall_x) & (wall_x < x_max) & (y_min <= wall_y) & (wall_y < y_max)
+        wall_distance = np.where(in_door, np.inf, distances[:, :walls]).min(axis=1, initial=np.inf)
+        if not len(self.floor):
+            return wall_distance
+        # the first of the closest floor edges, as the argmin of check_line_rect_collision
+        rows, nearest = np.arange(len(rays)), walls + distances[:, walls:].argmin(axis=1)
+        floor_x, floor_y = px[rows, nearest, None], py[rows, nearest, None]
+        x_min, y_min, x_max, y_max = self._room_bounds
+        in_room = ((x_min <= floor_x) & (floor_x <= x_max) & (y_min <= floor_y) & (floor_y <= y_max)).any(axis=1)
+        return np.minimum(wall_distance, np.where(in_room, np.inf, distances[rows, nearest]))
+
+
+class SegmentTable:
+    """Flat, contiguous table of the static segments of a map, compiled once at load time.
+
+    The static rows are the furniture edges and the walls and floor edges cast as is, walls the ones cast apart.
+    The last four rows are reserved to the objective, which is the only moving thing the sensor sees.
+    Large maps also get a SegmentGrid over the static rows, and a DistanceField when field_resolution is given.
+    obstacles, when given, is the ObstacleHash of the furniture answering the collision queries and rooms the
+    RoomRaster telling which room a point is in. free_space samples the spawn positions when obstacles is given,
+    doors is the DoorIndex of the map."""
+
+    def __init__(self, segments, room_rects, obstacle_rects, floor_rect, grid_min_segments=GRID_MIN_SEGMENTS,
+                 field_resolution=None, obstacles=None, rooms=None, doors=None, walls=None, field_segments=None):
+        self.segments = np.zeros((len(segments) + 4, 4))
+        self.segments[:len(segments)] = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        self.static = slice(0, len(segments))
+        self.objective = slice(len(segments), len(segments) + 4)
+        self.walls = walls
+        self.room_rects = room_rects
+        self.obstacle_rects = obstacle_rects
+        self.floor_rect = floor_rect
+        self.obstacles = obstacles
+        self.rooms = rooms
+        self.doors = doors
+        self.free_space = None
+        if obstacles is not None:
+            self.free_space = FreeSpace(obstacles.room_rects if rooms is None else rooms.boxes, obstacles,
+                                        self.colliding)
+        self.grid = None
+        if grid_min_segments is not None and len(segments) >= max(grid_min_segments, 1):
+            self.grid = SegmentGrid(self.segments[:len(segments)])
+        self.field = None
+        if field_resolution is not None and field_segments is None:
+            self.field = DistanceField(self.segments[self.static], room_rects, obstacle_rects, floor_rect,
+                                       field_resolution)
+        elif field_resolution is not None:
+            # the field measures the real geometry but finds its hits among the static rows, like the exact caster
+            self.field = DistanceField(np.asarray(field_segments, dtype=np.float64).reshape(-1, 4), room_rects,
+                                       obstacle_rects, floor_rect, field_resolution,
+                                       hit_segments=self.segments[self.static])
+
+    def __len__(self):
+        return len(self.segments) - 4 + (0 if self.walls is None else len(self.walls))
+
+    def set_objective(self, rect):
+        self.segments[self.objective] = rect_segments(rect)
+
+    def collision(self, rect):
+        """What the integer rect of the agent collides with: 'field', 'furniture', 'object' (standing on a piece of
+        furniture) or 'floor' when it leaves it, None when it is free. Furniture only counts in the rooms containing
+        the rect."""
+        if self.field is not None:
+            return 'field' if self.field.is_colliding(rect) else None
+        rooms = self.obstacles.rooms_containing(rect)
+        if rooms:
+            piece = self.obstacles.collision(rect, rooms=rooms)
+            if piece is None:
+                return None
+            return 'furniture' if self.obstacles.depths[piece] == 0 else 'object'
+        x, y, w, h = rect
+        floor_x, floor_y, floor_w, floor_h = self.floor_rect
+        if floor_x <= x and floor_y <= y and x + w <= floor_x + floor_w and y + h <= floor_y + floor_h:
+            return None
+        return 'floor'
+
+    def colliding(self, rects):
+        """collision(rect) is not None for every one of the (N, 4) integer rects, in one pass."""
+        rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        if self.field is not None:
+            return self.field.colliding(rects)
+        in_room, furniture = self.obstacles.collisions(rects)
+        x, y, w, h = rects.T
+        floor_x, floor_y, floor_w, floor_h = self.floor_rect
+        on_floor = (floor_x <= x) & (floor_y <= y) & (x + w <= floor_x + floor_w) & (y + h <= floor_y + floor_h)
+        return np.where(in_room, furniture, ~on_floor)
+
+
+def compile_map(rooms, floor, multiplier, grid_min_segments=GRID_MIN_SEGMENTS, field_resolution=None):
+    """Furniture edges, room walls and floor outline as whole segments, the ones with hits to drop in Walls: the
+    sensor sees what Environment.project_segments saw, bit for bit. The DistanceField measures the walls with
+    the door openings cut out and the floor outline outside every room instead, its hits are the sensor ones."""
+    segments, pieces = [], []
+    door_walls, door_rects = [], []
+    room_rects = [game_object_rect(room) for room in rooms]
+    obstacle_rects, obstacles = [], []
+    for index, (room, room_rect) in enumerate(zip(rooms, room_rects)):
+        # truncated like the pygame.Rect the door is drawn with
+        opening = tuple(int(value) for value in door_opening(room.door, multiplier))
+        for wall in rect_segments(room_rect):
+            pieces.extend(cut_segment(wall, opening))
+            if reaches(wall, opening):
+                door_walls.append(wall)
+                door_rects.append(opening)
+            else:
+                segments.append(wall)
+        for room_child in room.children:
+            obstacle_rects.append(game_object_rect(room_child))
+            obstacles.append((room_child.x, room_child.y, room_child.width, room_child.height, index, 0))
+            for child in room_child.children:
+                obstacle_rects.append(game_object_rect(child))
+                obstacles.append((child.x, child.y, child.width, child.height, index, 1))
+    furniture = [edge for obstacle_rect in obstacle_rects for edge in rect_segments(obstacle_rect)]
+    segments.extend(furniture)
+    floor_rect = game_object_rect(floor)
+    floor_segments = rect_segments(floor_rect)
+    floor_pieces = floor_segments
+    for room_rect in room_rects:
+        floor_pieces = [piece for segment in floor_pieces for piece in cut_segment(segment, room_rect)]
+    if any(reaches(segment, room_rect, right_edge=True) for segment in floor_segments for room_rect in room_rects):
+        walls = Walls(door_walls, door_rects, floor_segments, room_rects)
+    else:
+        segments.extend(floor_segments)
+        walls = Walls(door_walls, door_rects, [], room_rects)
+    return SegmentTable(segments, room_rects, obstacle_rects, floor_rect, grid_min_segments, field_resolution,
+                        ObstacleHash(room_rects, obstacles),
+                        RoomRaster([(room.x, room.y, room.width, room.height) for room in rooms]),
+                        DoorIndex([room.door for room in rooms]), walls, pieces + furniture + floor_pieces)
+
+
+class RaySensor:
+    """Batched laser sensor: casts the whole fan of rays against a SegmentTable at once.
+
+    A fan of angle_range / step rays is cast, the observation is resampled to output_rays entries when
+    they differ.
+
+    The result is written into a buffer owned by the sensor, callers keeping it across frames
+    must copy it."""
+
+    def __init__(self, angle_range=ANGLE_RANGE, step=STEP, max_range=MAX_RANGE, sphere_trace=False,
+                 output_rays=OUTPUT_RAYS):
+        self._angle_range = angle_range
+        self._step = step
+        self._max_range = max_range
+        self._ray_number = math.ceil(angle_range / step - 1e-9)
+        self._output_rays = output_rays
+        self._rays = np.zeros((self._ray_number, 4))
+        self._points = np.zeros((self._ray_number, 3))
+        self._output_points = np.zeros((output_rays, 3))
+        self._directions = {}
+        self._output_angles = {}
+        # march through the DistanceField of the table, when it has one, instead of testing segments
+        self._sphere_trace = sphere_trace
+        # position of every output ray in the fan, in rays
+        self._resampled = output_rays != self._ray_number or not math.isclose(step, angle_range / output_rays)
+        position = np.minimum(np.arange(output_rays) * (angle_range / output_rays) / step, self._ray_number - 1)
+        self._output_left = np.floor(position).astype(int)
+        self._output_right = np.minimum(self._output_left + 1, self._ray_number - 1)
+        self._output_weight = position - self._output_left
+
+    @classmethod
+    def with_ray_count(cls, angle_range=ANGLE_RANGE, ray_count=OUTPUT_RAYS, max_range=MAX_RANGE, **kwargs):
+        return cls(angle_range, angle_range / ray_count, max_range, **kwargs)
+
+    @property
+    def ray_number(self):
+        return self._ray_number
+
+    @property
+    def step(self):
+        return self._step
+
+    @property
+    def max_range(self):
+        return self._max_range
+
+    @property
+    def output_rays(self):
+        return self._output_rays
+
+    @property
+    def exact_distances(self):
+        # every output distance is the one of a ray cast exactly, none is interpolated or sphere traced
+        return not (self._resampled or self._sphere_trace)
+
+    def first_slope(self, rot):
+        return (rot + self._angle_range / 2) % 360
+
+    def ray_directions(self, rot):
+        # computed once per heading with math, so the ray ends match the scalar caster bit for bit
+        if rot not in self._directions:
+            slope = self.first_slope(rot)
+            dxs, dys, angles = [], [], []
+            for _ in range(self._ray_number):
+                dxs.append(math.cos(math.radians(slope)) * self._max_range)
+                dys.append(math.sin(math.radians(slope)) * self._max_range)
+                slope = (slope - self._step) % 360
+                angles.append(slope / 359)
+            self._directions[rot] = np.array(dxs), np.array(dys), np.array(angles)
+        return self._directions[rot]
+
+    def output_angles(self, rot):
+        # angle entries of the resampled observation, as if output_rays rays were cast over the same range
+        if rot not in self._output_angles:
+            slope, step, angles = self.first_slope(rot), self._angle_range / self._output_rays, []
+            for _ in range(self._output_rays):
+                slope = (slope - step) % 360
+                angles.append(slope / 359)
+            self._output_angles[rot] = np.array(angles)
+        return self._output_angles[rot]
+
+    @classmethod
+    def _exact_static_distances(cls, rays, table):
+        if table.grid is None:
+            distances = geometry.backend().nearest_hits(rays, table.segments[table.static])
+        else:
+            ray_index, segment_index = table.grid.candidates(rays)
+            distances = np.full(len(rays), np.inf)
+            np.minimum.at(distances, ray_index,
+                          geometry.backend().hit_distances(*rays[ray_index].T, *table.segments[segment_index].T))
+        if table.walls is not None:
+            distances = np.minimum(distances, table.walls.nearest_hits(rays))
+        return distances
+
+    def cast_static(self, rays, table):
+        """Distance of the first static hit of each ray (R, 4), inf when nothing is hit."""
+        if table.field is None or not self._sphere_trace:
+            return self._exact_static_distances(rays, table)
+        # sphere traced, the few rays grazing a wall for too long are finished exactly
+        distances = table.field.trace(rays)
+        unresolved = np.isnan(distances)
+        if unresolved.any():
+            distances[unresolved] = self._exact_static_distances(rays[unresolved], table)
+        if table.walls is not None:
+            distances = np.minimum(distances, table.walls.nearest_hits(rays))
+        return distances
+
+    def _objective_distances(self, rays, table, eye_point, objective_rect):
+        x, y, width, height = objective_rect
+        gap_x = max(x - eye_point[0], eye_point[0] - (x + width), 0)
+        gap_y = max(y - eye_point[1], eye_point[1] - (y + height), 0)
+        if gap_x * gap_x + gap_y * gap_y > self._max_range * self._max_range:
+            # out of range, no ray can reach it
+            return np.full(len(rays), np.inf)
+        return geometry.backend().nearest_hits(rays, table.segments[table.objective])
+
+    def make_rays(self, eye_points, rot, out=None):
+        """The fan of every eye point (N, 2), as (N * ray_number, 4) rays."""
+        dxs, dys, _ = self.ray_directions(rot)
+        eye_points = np.asarray(eye_points, dtype=np.float64).reshape(-1, 2)
+        rays = np.empty((len(eye_points) * self._ray_number, 4)) if out is None else out
+        rays[:, 0] = np.repeat(eye_points[:, 0], self._ray_number)
+        rays[:, 1] = np.repeat(eye_points[:, 1], self._ray_number)
+        rays[:, 2] = rays[:, 0] + np.tile(dxs, len(eye_points))
+        rays[:, 3] = rays[:, 1] - np.tile(dys, len(eye_points))
+        return rays
+
+    def static_distances(self, eye_points, rot, table):
+        """Distance of the first static hit of every ray of every eye point (N, 2), inf when nothing is hit."""
+        eye_points = np.asarray(eye_points, dtype=np.float64).reshape(-1, 2)
+        distances = np.empty((len(eye_points), self._ray_number))
+        rows = max(BATCH_SIZE // (self._ray_number * max(len(table), 1)), 1)
+        for start in range(0, len(eye_points), rows):
+            rays = self.make_rays(eye_points[start:start + rows], rot)
+            distances[start:start + rows] = self.cast_static(rays, table).reshape(-1, self._ray_number)
+        return distances
+
+    def _resample(self, points, out):
+        # distances are interpolated between the two closest rays, the objective flag is the one of the closest
+        left, right, weight = self._output_left, self._output_right, self._output_weight
+        out[..., 1] = points[..., left, 1] * (1 - weight) + points[..., right, 1] * weight
+        out[..., 2] = np.where(weight < 0.5, points[..., left, 2], points[..., right, 2])
+        return out
+
+    def project(self, eye_point, rot, table, objective_rect, static_distances=None):
+        """Observation of one pose. static_distances, when known (e.g. from a StaticObservationTable), saves
+        everything but the objective test."""
+        _, _, angles = self.ray_directions(rot)
+        rays = self.make_rays(eye_point, rot, out=self._rays)
+        table.set_objective(objective_rect)
+        if static_distances is None:
+            static_distances = self.cast_static(rays, table)
+        objective_distances = self._objective_distances(rays, table, eye_point, objective_rect)
+        chosen_distances = np.minimum(static_distances, objective_distances)
+        any_hit = np.isfinite(chosen_distances)
+        is_objective = any_hit & (objective_distances == chosen_distances)
+
+        points = self._points
+        points[:, 0] = angles
+        points[:, 1] = np.where(any_hit, chosen_distances / self._max_range, 1)
+        points[:, 2] = is_objective
+        if not self._resampled:
+            return points, bool(is_objective[-1])
+        output_points = self._output_points
+        output_points[:, 0] = self.output_angles(rot)
+        self._resample(points, output_points)
+        return output_points, bool(output_points[-1, 2])
+
+    @staticmethod
+    def _known_static_distances(eye_points, rot, indexes, static_sources, out):
+        # fills out for the poses of indexes a source knows, returns the indexes left to cast
+        if not static_sources:
+            return indexes
+        unknown = []
+        for index, eye_point in zip(indexes.tolist(), eye_points[indexes].tolist()):
+            for source in static_sources:
+                distances = source.static_distances(tuple(eye_point), rot)
+                if distances is not None:
+                    out[index] = distances
+                    break
+            else:
+                unknown.append(index)
+        return np.array(unknown, dtype=np.int64)
+
+    def project_many(self, eye_points, rots, table, objective_rects, static_sources=()):
+        """Observations of N poses at once, without touching the table: eye points (N, 2), headings (N,) and
+        objective rects (N, 4). Returns the (N, output_rays, 3) observations and the (N,) looking flags.
+        static_sources (e.g. a StaticObservationTable, then a ScanCache) are asked in turn for the static
+        distances of every pose, only the poses none of them knows are cast."""
+        eye_points = np.asarray(eye_points, dtype=np.float64).reshape(-1, 2)
+        rots = np.broadcast_to(np.asarray(rots), (len(eye_points),))
+        objective_rects = np.broadcast_to(np.asarray(objective_rects, dtype=np.float64), (len(eye_points), 4))
+        points = np.empty((len(eye_points), self._ray_number, 3))
+        output_points = np.empty((len(eye_points), self._output_rays, 3)) if self._resampled else points
+        rays = np.empty((len(eye_points), self._ray_number, 4))
+        static_distances = np.empty((len(eye_points), self._ray_number))
+        for rot in np.unique(rots):
+            rot = rot.item()
+            same = rots == rot
+            rays[same] = self.make_rays(eye_points[same], rot).reshape(-1, self._ray_number, 4)
+            cast = self._known_static_distances(eye_points, rot, np.flatnonzero(same), static_sources,
+                                                static_distances)
+            if len(cast):
+                static_distances[cast] = self.static_distances(eye_points[cast], rot, table)
+            points[same, :, 0] = self.ray_directions(rot)[2]
+            if self._resampled:
+                output_points[same, :, 0] = self.output_angles(rot)
+        x, y, width, height = (objective_rects[:, None, None, i] for i in range(4))
+        objective_segments = np.stack([np.broadcast_to(value, (len(eye_points), 1, 4)) for value in (
+            np.concatenate([x, x, x + width, x], axis=2),
+            np.concatenate([y, y + height, y + height, y], axis=2),
+            np.concatenate([x, x + width, x + width, x + width], axis=2),
+            np.concatenate([y + height, y + height, y, y], axis=2))])
+        objective_distances = geometry.backend().hit_distances(*(rays[:, :, i, None] for i in range(4)),
+                                                               *objective_segments).min(axis=2)
+        chosen_distances = np.minimum(static_distances, objective_distances)
+        any_hit = np.isfinite(chosen_distances)
+        is_objective = any_hit & (objective_distances == chosen_distances)
+        points[:, :, 1] = np.where(any_hit, chosen_distances / self._max_range, 1)
+        points[:, :, 2] = is_objective
+        if not self._resampled:
+            return points, is_objective[:, -1]
+        self._resample(points, output_points)
+        return output_points, output_points[:, -1, 2].astype(bool)
+
+
+class StaticObservationTable:
+    """Memory mapped table of the static sensor distances for every integer eye point on the floor of a map and
+    every heading the agent can face, so that at runtime only the objective is left to intersect.
+
+    Hits are stored as their integer squared distance + 1 (the hit points are integer), 0 for entries not
+    computed yet and -1 for rays hitting nothing, which gives back the exact distances of the sensor. Missing
+    entries are computed on first use, precompute() fills the whole table offline."""
+
+    HEADINGS = tuple(range(0, 360, 45))
+
+    def __init__(self, directory, table, sensor):
+        self.table = table
+        self._sensor = sensor
+        self._x, self._y, width, height = table.floor_rect
+        fingerprint = hashlib.sha1(table.segments[table.static].tobytes())
+        if table.walls is not None:
+            for part in (table.walls.segments, table.walls.doors, table.walls.floor):
+                fingerprint.update(part.tobytes())
+        fingerprint.update(np.array(sensor.ray_directions(0)).tobytes())
+        self.path = os.path.join(directory, f'static_{fingerprint.hexdigest()[:16]}.npy')
+        shape = (len(self.HEADINGS), height, width, sensor.ray_number)
+        os.makedirs(directory, exist_ok=True)
+        if os.path.isfile(self.path):
+            self._data = np.load(self.path, mmap_mode='r+')
+        else:
+            self._data = np.lib.format.open_memmap(self.path, mode='w+', dtype=np.int32, shape=shape)
+
+    def _index(self, eye_point, rot):
+        if rot not in self.HEADINGS:
+            return None
+        if eye_point[0] != int(eye_point[0]) or eye_point[1] != int(eye_point[1]):
+            return None
+        row, column = int(eye_point[1]) - self._y, int(eye_point[0]) - self._x
+        if not (0 <= row < self._data.shape[1] and 0 <= column < self._data.shape[2]):
+            return None
+        return self.HEADINGS.index(rot), row, column
+
+    @staticmethod
+    def encode(distances):
+        return np.where(np.isfinite(distances), np.rint(np.where(np.isfinite(distances), distances, 0) ** 2) + 1,
+                        -1).astype(np.int32)
+
+    @staticmethod
+    def decode(entries):
+        with np.errstate(invalid='ignore'):
+            return np.where(entries < 0, np.inf, np.sqrt(entries - 1.0))
+
+    def static_distances(self, eye_point, rot):
+        """Static distances of a pose, None when the pose is outside the table."""
+        index = self._index(eye_point, rot)
+        if index is None:
+            return None
+        entries = np.asarray(self._data[index])
+        if entries[0] == 0:
+            entries = self.encode(self._sensor.static_distances(eye_point, rot, self.table)[0])
+            self._data[index] = entries
+        return self.decode(entries)
+
+    def precompute(self, logger=None):
+        for heading_index, rot in enumerate(self.HEADINGS):
+            for row in range(self._data.shape[1]):
+                if (self._data[heading_index, row, :, 0] != 0).all():
+                    continue
+                eye_points = np.stack([self._x + np.arange(self._data.shape[2]),
+                                       np.full(self._data.shape[2], self._y + row)], axis=1)
+                self._data[heading_index, row] = self.encode(self._sensor.static_distances(eye_points, rot,
+                                                                                           self.table))
+            self._data.flush()
+            if logger: logger.debug(0, f"static observations precomputed for heading {rot}")
+
+    def close(self):
+        self._data.flush()
+        del self._data
+
+
+class ScanCache:
+    """LRU cache of 360 degree static scans, one ray every sensor step, keyed on the eye point.
+
+    A fan is a window of the scan of its eye point: rotating in place or coming back to a visited point
+    slices the cached scan instead of casting again. Scans are filled lazily, a fan only casts the rays of
+    its window its eye point has not cast yet, so the cache never casts more rays than the sensor alone.
+    hits counts the fans served without casting, misses the others and rays_cast the rays they cast, against
+    ray_number per fan without the cache. Headings whose fan does not fall on the scan rays are not served."""
+
+    def __init__(self, table, sensor, capacity=4096):
+        self.table = table
+        self._sensor = sensor
+        self._capacity = capacity
+        self._scans = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rays_cast = 0
+        self._slopes = np.arange(0, 360, sensor.step)
+        # same expression as RaySensor.ray_directions, so a slice of the scan is exactly the fan
+        self._dxs = np.array([math.cos(math.radians(slope)) * sensor.max_range for slope in self._slopes])
+        self._dys = np.array([math.sin(math.radians(slope)) * sensor.max_range for slope in self._slopes])
+
+    def __len__(self):
+        return len(self._scans)
+
+    def _window(self, rot):
+        first = self._sensor.first_slope(rot)
+        if 360 % self._sensor.step or first % self._sensor.step:
+            return None
+        return (int(first // self._sensor.step) - np.arange(self._sensor.ray_number)) % len(self._slopes)
+
+    def scan(self, eye_point):
+        """The scan of the eye point, nan for the rays not cast yet."""
+        key = (eye_point[0], eye_point[1])
+        if key in self._scans:
+            self._scans.move_to_end(key)
+            return self._scans[key]
+        self._scans[key] = np.full(len(self._slopes), np.nan)
+        if len(self._scans) > self._capacity:
+            self._scans.popitem(last=False)
+        return self._scans[key]
+
+    def static_distances(self, eye_point, rot):
+        """Static distances of a pose, None when its heading is not served."""
+        window = self._window(rot)
+        if window is None:
+            return None
+        scan = self.scan(eye_point)
+        distances = scan[window]
+        missing = window[np.isnan(distances)]
+        if not len(missing):
+            self.hits += 1
+            return distances
+        self.misses += 1
+        self.rays_cast += len(missing)
+        rays = np.empty((len(missing), 4))
+        rays[:, 0] = eye_point[0]
+        rays[:, 1] = eye_point[1]
+        rays[:, 2] = eye_point[0] + self._dxs[missing]
+        rays[:, 3] = eye_point[1] - self._dys[missing]
+        scan[missing] = self._sensor.cast_static(rays, self.table)
+        return scan[window]
@@ -1,15 +1,22 @@
 from pyswip import *
 import pygame
 import random
-import numpy as np
 import math
-import json
 import datetime
-from utils.utils import Check_Collisions, Agent, Vertex, Room, Game_Object
+from utils.utils import Check_Collisions, Vertex, Room, Game_Object
+from utils.sensor import door_opening
+from utils.maps import save_map
+from utils.world import World, WorldField
 
 
 class Environment:
     """Class to generate and simulate the world environment"""
+    _rooms = WorldField('rooms')
+    _floor = WorldField('floor')
+    _agent = WorldField('agent')
+    _objective = WorldField('objective')
+    _screen = WorldField('screen')
+    _segments = WorldField('segments')
 
     def __init__(self, env_width, env_height, multiplier, fake_collision_mt, door_fake_collision_mt):
         self._type_to_sprite = None
@@ -17,15 +24,11 @@ class Environment:
         self._env_height = env_height * multiplier
         self._multiplier = multiplier
         self._checker = Check_Collisions()
+        self._world = World(multiplier)
         self._prolog = Prolog()
         self._fake_collision_mt = fake_collision_mt
         self._door_fake_collision_mt = door_fake_collision_mt
-        self._floor = Game_Object(0, 0, 0, 0, 0, 'floor')
-        self._agent = Agent(9999, 9999, 8, 8, 0, 'agent', 90)
-        self._objective = Game_Object(9800, 9800, 15, 15, 0, 'objective')
         self._objective_position = []
-        self._rooms = []
-        self._screen = None
         prolog_query = "use_module(library(clpr))"
 
         for solution in self._prolog.query(prolog_query):
@@ -43,6 +46,7 @@ class Environment:
             self.populate_kitchen(kitchen, random.randint(0, 3), random.randint(0, 1))
         for hall in self.get_rooms(flag='hall'):
             self.populate_hall(hall, random.randint(0, 1), random.randint(0, 2), random.randint(0, 2), 1.0)
+        self.compile_map()
 
     def draw_model(self):
         if len(self._rooms) > 1:
@@ -68,16 +72,9 @@ class Environment:
             self._screen.blit(room.sprite.image, room.sprite.rect)
             pygame.draw.rect(self._screen, (255, 255, 255), room.sprite.rect, 2)
 
-            if room.door.width == 0:
-                blitRect = pygame.Rect(room.door.x - 0.5 * self._multiplier, room.door.y, 1.0 * self._multiplier,
-                                       room.door.height)
-                self._screen.blit(room.door.sprite.image, blitRect)
-                room.door.sprite.rect = blitRect
-            else:
-                blitRect = pygame.Rect(room.door.x, room.door.y - 0.5 * self._multiplier, room.door.width,
-                                       1.0 * self._multiplier)
-                self._screen.blit(room.door.sprite.image, blitRect)
-                room.door.sprite.rect = blitRect
+            blitRect = pygame.Rect(door_opening(room.door, self._multiplier))
+            self._screen.blit(room.door.sprite.image, blitRect)
+            room.door.sprite.rect = blitRect
 
             for room_child in room.children:
                 self._screen.blit(room_child.sprite.image, room_child.sprite.rect)
@@ -136,19 +133,18 @@ class Environment:
             self.draw_model()
 
     def reset_objective(self):
-        ridx = random.randint(0, len(self._rooms) - 1)
-        self._objective.x = int(random.uniform(self._rooms[ridx].x * 1.15,
-                                               (self._rooms[ridx].x + self._rooms[ridx].width * 0.85)))
-        self._objective.y = int(random.uniform(self._rooms[ridx].y * 1.15,
-                                               (self._rooms[ridx].y + self._rooms[ridx].height * 0.85)))
+        # same free positions as the training loop, the objective never lands on furniture
+        if self._segments is None:
+            self.compile_map()
+        self._objective.x, self._objective.y = self._segments.free_space.sample_objective(
+            self._objective.sprite.rect.width, self._objective.sprite.rect.height)
         self._objective.sprite.rect.x = self._objective.x
         self._objective.sprite.rect.y = self._objective.y
 
     def reset(self):
         self._env_width = 15.0 * self._multiplier
         self._env_height = 15.0 * self._multiplier
-        self._floor = Game_Object(0, 0, 0, 0, 0, 'floor')
-        self._rooms = []
+        self._world.teardown()
 
     def generate_rooms_and_doors(self, bathroom_no, bedroom_no,
                                  kitchen_no, hall_no,
@@ -2021,94 +2017,39 @@ class Environment:
                 hall.children.append(table)
         self._prolog.retract(predicate_head + predicate_body)
 
-    def project_segments(self, logger=None):
-        is_agent_looking_at_objective = False
-        angle_range = 120
-        step = 3
-        eye_point = self._agent.sprite.rect.center
-        slope = (self._agent._target_rot + angle_range / 2) % 360
-        points = []
-
-        for i in range(0, angle_range, step):
-            is_agent_looking_at_objective = False
-            x = math.cos(math.radians(slope)) * 220
-            y = math.sin(math.radians(slope)) * 220
-            view_point = (eye_point[0] + x, eye_point[1] - y)
-            slope = (slope - step) % 360
-            intersection_points = []
-            intersection_points_distances = []
-
-            for room in self._rooms:
-                intersection_point = self._checker.check_line_room_collision((eye_point[0], eye_point[1], view_point[0],
-                                                                              view_point[1]), room)
-                if intersection_point is not None:
-                    intersection_points.append(intersection_point)
-                for room_child in room.children:
-                    intersection_point = self._checker.check_line_rect_collision((eye_point[0], eye_point[1],
-                                                                                  view_point[0], view_point[1]),
-                                                                                 room_child.sprite.rect)
-                    if intersection_point is not None:
-                        intersection_points.append(intersection_point)
-                    for child in room_child.children:
-                        intersection_point = self._checker.check_line_rect_collision((eye_point[0], eye_point[1],
-                                                                                      view_point[0], view_point[1]),
-                                                                                     child.sprite.rect)
-                        if intersection_point is not None:
-                            intersection_points.append(intersection_point)
-            intersection_point_floor = self._checker.check_line_rect_collision((eye_point[0], eye_point[1],
-                                                                                view_point[0], view_point[1]),
-                                                                               self._floor.sprite.rect)
-            if intersection_point_floor is not None:
-                any_room_contains_point = False
-                for room in self._rooms:
-                    if self._checker.check_rect_contains_point(room.sprite.rect, intersection_point_floor):
-                        any_room_contains_point = True
-                        break
-                if not any_room_contains_point:
-                    intersection_points.append(intersection_point_floor)
-            intersection_point_objective = self._checker.check_line_rect_collision((eye_point[0], eye_point[1],
-                                                                                    view_point[0], view_point[1]),
-                                                                                   self._objective.sprite.rect)
-            if intersection_point_objective is not None:
-                intersection_points.append(intersection_point_objective)
-            for point in intersection_points:
-                intersection_points_distances.append(self._checker.point_point_distance(eye_point, point))
-            if len(intersection_points) > 0:
-                chosen_index = np.argmin(intersection_points_distances)
-                chosen_point = intersection_points[chosen_index]
-                if chosen_point == intersection_point_objective:
-                    is_agent_looking_at_objective = True
-
-                points.append((slope / 359, intersection_points_distances[chosen_index] / 220,
-                               is_agent_looking_at_objective))
-            else:
-                points.append((slope / 359, 1, False))
+    def use_world(self, world):
+        self._world = world
 
-        return points, is_agent_looking_at_objective
+    def compile_map(self):
+        self._world.compile()
 
-    def save_generated_model(self):
-        serialized_floor = dict(x=self._floor.x, y=self._floor.y, width=self._floor.width, height=self._floor.height)
+    def use_sensor(self, sensor):
+        self._world.use_sensor(sensor)
 
-        serialized_environment = dict(roomNumber=len(self._rooms), floor=serialized_floor)
+    def use_static_lookup(self, directory):
+        self._world.use_static_lookup(directory)
 
-        for room in self._rooms:
-            serialized_room = dict(x=room.x, y=room.y, width=room.width, height=room.height, type=room.type,
-                                   children=[], door=dict(x=room.door.x, y=room.door.y, width=room.door.width,
-                                                          height=room.door.height))
-            for child in room.children:
-                serialized_child = dict(x=child.x, y=child.y, width=child.width, height=child.height, type=child.type,
-                                        orientation=child.orientation, children=[])
-                for ch in child.children:
-                    serialized_child_child = dict(x=ch.x, y=ch.y, width=ch.width, height=ch.height, type=ch.type,
-                                                  orientation=ch.orientation)
-                    serialized_child["children"].append(serialized_child_child)
-                serialized_room["children"].append(serialized_child)
-
-            serialized_environment["R" + str(room.index)] = serialized_room
-
-        with open('./environments/_environment ' + str(
-                str(datetime.datetime.now().year) + '-' + str(datetime.datetime.now().month) + '-' + str(
-                    datetime.datetime.now().day) + " " + str(datetime.datetime.now().hour) + "-" + str(
-                    datetime.datetime.now().minute) + "-" + str(datetime.datetime.now().second)) + ".json",
-                  'w') as outfile:
-            json.dump(serialized_environment, outfile)
+    def static_lookup(self):
+        return self._world.static_lookup()
+
+    def use_scan_cache(self, capacity):
+        self._world.use_scan_cache(capacity)
+
+    def scan_cache(self):
+        return self._world.scan_cache()
+
+    def invalidate_observation(self):
+        self._world.invalidate()
+
+    def project_segments(self, logger=None):
+        return self._world.observe()
+
+    def project_poses(self, eye_points, rots, objective_rects=None):
+        return self._world.observe_poses(eye_points, rots, objective_rects)
+
+    def save_generated_model(self):
+        save_map('./environments/_environment ' + str(
+            str(datetime.datetime.now().year) + '-' + str(datetime.datetime.now().month) + '-' + str(
+                datetime.datetime.now().day) + " " + str(datetime.datetime.now().hour) + "-" + str(
+                datetime.datetime.now().minute) + "-" + str(datetime.datetime.now().second)) + ".json",
+            self._floor, self._rooms)
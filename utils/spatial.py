@@ -0,0 +1,494 @@
+import math
+import random
+
+import numpy as np
+from utils import geometry
+
+GRID_CELL_SIZE = 32
+# segments lying on a grid line are registered on both sides of it
+GRID_EPSILON = 1e-6
+# side of the buckets of the obstacle hash, about the size of a small piece of furniture
+HASH_CELL_SIZE = 32
+
+
+class SegmentGrid:
+    """Uniform grid over the static segments of a map.
+
+    Every segment is registered in the cells its bounding box overlaps, a ray only gets back the
+    segments of the cells it crosses. Cells are stored CSR-like: the items of cell i are
+    items[starts[i]:starts[i + 1]]."""
+
+    def __init__(self, segments, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        xs = segments[:, [0, 2]]
+        ys = segments[:, [1, 3]]
+        self._origin = (math.floor(xs.min()) - cell_size, math.floor(ys.min()) - cell_size)
+        self._shape = (int((xs.max() - self._origin[0]) // cell_size) + 2,
+                       int((ys.max() - self._origin[1]) // cell_size) + 2)
+        x_low = ((xs.min(axis=1) - self._origin[0] - GRID_EPSILON) // cell_size).astype(int)
+        x_high = ((xs.max(axis=1) - self._origin[0] + GRID_EPSILON) // cell_size).astype(int)
+        y_low = ((ys.min(axis=1) - self._origin[1] - GRID_EPSILON) // cell_size).astype(int)
+        y_high = ((ys.max(axis=1) - self._origin[1] + GRID_EPSILON) // cell_size).astype(int)
+        cells, items = [], []
+        for i in range(len(segments)):
+            for cx in range(x_low[i], x_high[i] + 1):
+                for cy in range(y_low[i], y_high[i] + 1):
+                    cells.append(cx * self._shape[1] + cy)
+                    items.append(i)
+        cells = np.array(cells, dtype=np.int64)
+        order = np.argsort(cells, kind='stable')
+        self._items = np.array(items, dtype=np.int64)[order]
+        self._starts = np.searchsorted(cells[order], np.arange(self._shape[0] * self._shape[1] + 1))
+
+    def __len__(self):
+        return self._shape[0] * self._shape[1]
+
+    def crossed_cells(self, rays):
+        """Ids of the cells crossed by each ray (R, 4), -1 padded, every cell appearing at most once per row."""
+        x1, y1, x2, y2 = (rays[:, i, None] for i in range(4))
+        dx, dy = x2 - x1, y2 - y1
+        size = self.cell_size
+        crossings = int(max(np.abs(dx).max(), np.abs(dy).max()) // size) + 2
+        steps = np.arange(crossings)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            first_x = np.where(dx > 0, np.floor((x1 - self._origin[0]) / size) + 1,
+                               np.ceil((x1 - self._origin[0]) / size) - 1)
+            first_y = np.where(dy > 0, np.floor((y1 - self._origin[1]) / size) + 1,
+                               np.ceil((y1 - self._origin[1]) / size) - 1)
+            t_x = (self._origin[0] + (first_x + np.sign(dx) * steps) * size - x1) / dx
+            t_y = (self._origin[1] + (first_y + np.sign(dy) * steps) * size - y1) / dy
+        t = np.concatenate([np.zeros_like(x1), t_x, t_y, np.ones_like(x1)], axis=1)
+        t = np.sort(np.where((t >= 0) & (t <= 1), t, 1), axis=1)
+        # one sample per interval between consecutive grid lines, so every crossed cell is hit
+        middle = (t[:, :-1] + t[:, 1:]) / 2
+        cx = ((x1 + middle * dx - self._origin[0]) // size).astype(int)
+        cy = ((y1 + middle * dy - self._origin[1]) // size).astype(int)
+        inside = (0 <= cx) & (cx < self._shape[0]) & (0 <= cy) & (cy < self._shape[1])
+        cells = np.sort(np.where(inside, cx * self._shape[1] + cy, -1), axis=1)
+        cells[:, 1:][cells[:, 1:] == cells[:, :-1]] = -1
+        return cells
+
+    def candidates(self, rays):
+        """Flat (ray index, segment index) pairs to be tested, a segment may be listed more than once per ray."""
+        cells = self.crossed_cells(rays)
+        valid = cells >= 0
+        cells = np.where(valid, cells, 0)
+        starts = self._starts[cells]
+        counts = np.where(valid, self._starts[cells + 1] - starts, 0).ravel()
+        total = counts.sum()
+        ray_index = np.repeat(np.repeat(np.arange(len(rays)), cells.shape[1]), counts)
+        offsets = np.repeat(starts.ravel() - (np.cumsum(counts) - counts), counts)
+        return ray_index, self._items[offsets + np.arange(total)]
+
+
+def integral_image(mask):
+    table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = mask.cumsum(axis=0).cumsum(axis=1)
+    return table
+
+
+def point_segment_distances(xs, ys, segments):
+    """Distance of every point (P,) to every segment (S, 4), as a (P, S) matrix."""
+    x3, y3, x4, y4 = (segments[None, :, i] for i in range(4))
+    dx, dy = x4 - x3, y4 - y3
+    length = dx * dx + dy * dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(length > 0, ((xs[:, None] - x3) * dx + (ys[:, None] - y3) * dy) / length, 0)
+    t = np.clip(t, 0, 1)
+    return np.hypot(xs[:, None] - (x3 + t * dx), ys[:, None] - (y3 + t * dy))
+
+
+class DistanceField:
+    """Signed distance raster of a map, for clearance and collision lookups and sphere-traced rays.
+
+    distance holds, for the centre of every resolution x resolution cell, the distance to the closest
+    static segment, negative inside furniture and outside the floor. Reading the cell of a point is
+    within error = resolution * sqrt(2) / 2 of its exact distance.
+
+    Rays march by the clearance they read until they come within hit_tolerance of a segment, where
+    they are tested exactly against the few hit_segments listed for that cell. hit_segments default to
+    segments; a SegmentTable passes its static rows, the walls it casts apart being added by the sensor,
+    so traced hits are the same as the exact ones. Collisions are answered on one pixel integral images of
+    the furniture and of the space outside the floor, so they are exact for integer rects.
+
+    Tracing only pays off on very dense maps: on bench sensor, from 0 to 1600 pieces of furniture, a traced
+    ray costs 35 to 95 us, an exact one 5 to 285 us brute force and 15 to 50 us through the SegmentGrid."""
+
+    def __init__(self, segments, room_rects, obstacle_rects, floor_rect, resolution=2, max_steps=48,
+                 chunk_size=2 ** 21, hit_segments=None):
+        self.resolution = resolution
+        # float32 storage costs a little more than the half diagonal
+        self.error = resolution * math.sqrt(2) / 2 + 1e-3
+        self.hit_tolerance = 2 * self.error
+        # hit points are truncated to integers, up to sqrt(2) closer than the exact ones
+        self._window = self.hit_tolerance + math.sqrt(2)
+        self._max_steps = max_steps
+        self._segments = segments if hit_segments is None else hit_segments
+        xs = np.concatenate([segments[:, [0, 2]].ravel(), [floor_rect[0], floor_rect[0] + floor_rect[2]]])
+        ys = np.concatenate([segments[:, [1, 3]].ravel(), [floor_rect[1], floor_rect[1] + floor_rect[3]]])
+        self._origin = (math.floor(xs.min()) - 2 * resolution, math.floor(ys.min()) - 2 * resolution)
+        width = math.ceil(xs.max()) + 2 * resolution - self._origin[0]
+        height = math.ceil(ys.max()) + 2 * resolution - self._origin[1]
+
+        furniture = np.zeros((height, width), dtype=bool)
+        for x, y, w, h in obstacle_rects:
+            furniture[max(y - self._origin[1], 0):max(y + h - self._origin[1], 0),
+                      max(x - self._origin[0], 0):max(x + w - self._origin[0], 0)] = True
+        outside = np.ones((height, width), dtype=bool)
+        x, y, w, h = floor_rect
+        outside[y - self._origin[1]:y + h - self._origin[1], x - self._origin[0]:x + w - self._origin[0]] = False
+        self._furniture = integral_image(furniture)
+        self._outside = integral_image(outside)
+        self._room_rects = np.asarray(room_rects, dtype=np.float64).reshape(-1, 4)
+
+        self._shape = (math.ceil(height / resolution), math.ceil(width / resolution))
+        centre_x = self._origin[0] + (np.arange(self._shape[1]) + 0.5) * resolution
+        centre_y = self._origin[1] + (np.arange(self._shape[0]) + 0.5) * resolution
+        grid_x, grid_y = np.meshgrid(centre_x, centre_y)
+        grid_x, grid_y = grid_x.ravel(), grid_y.ravel()
+        distance = np.empty(grid_x.shape)
+        # every segment a ray can hit inside the window of a point of the cell
+        near_radius = self._window + 2 * self.error
+        near_cells, near_items = [], []
+        rows = max(chunk_size // max(len(segments), len(self._segments), 1), 1)
+        for start in range(0, len(distance), rows):
+            distances = point_segment_distances(grid_x[start:start + rows], grid_y[start:start + rows], segments)
+            distance[start:start + rows] = distances.min(axis=1, initial=np.inf)
+            if hit_segments is not None:
+                distances = point_segment_distances(grid_x[start:start + rows], grid_y[start:start + rows],
+                                                    self._segments)
+            cells, items = np.nonzero(distances <= near_radius)
+            near_cells.append(cells + start)
+            near_items.append(items)
+        near_cells = np.concatenate(near_cells)
+        self._near_items = np.concatenate(near_items)[np.argsort(near_cells, kind='stable')]
+        self._near_starts = np.searchsorted(np.sort(near_cells), np.arange(len(distance) + 1))
+
+        pixel_x = np.clip((grid_x - self._origin[0]).astype(int), 0, width - 1)
+        pixel_y = np.clip((grid_y - self._origin[1]).astype(int), 0, height - 1)
+        blocked = furniture[pixel_y, pixel_x] | outside[pixel_y, pixel_x]
+        self.distance = np.where(blocked, -distance, distance).reshape(self._shape).astype(np.float32)
+
+    def _cells(self, xs, ys):
+        column = np.floor((xs - self._origin[0]) / self.resolution).astype(int)
+        row = np.floor((ys - self._origin[1]) / self.resolution).astype(int)
+        inside = (0 <= row) & (row < self._shape[0]) & (0 <= column) & (column < self._shape[1])
+        return np.where(inside, row, 0), np.where(inside, column, 0), inside
+
+    def clearance(self, xs, ys):
+        """Signed distance to the closest obstacle, +inf off the raster, where nothing can be hit any more."""
+        row, column, inside = self._cells(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+        return np.where(inside, self.distance[row, column].astype(np.float64), np.inf)
+
+    def _box_sum(self, table, rect):
+        x, y, w, h = rect
+        height, width = table.shape[0] - 1, table.shape[1] - 1
+        top, bottom = min(max(y - self._origin[1], 0), height), min(max(y + h - self._origin[1], 0), height)
+        left, right = min(max(x - self._origin[0], 0), width), min(max(x + w - self._origin[0], 0), width)
+        return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+    def is_colliding(self, rect):
+        """Same answer as Training.is_agent_colliding_world for an integer rect, in constant time."""
+        x, y, w, h = rect
+        rooms = self._room_rects
+        in_room = ((rooms[:, 0] <= x) & (rooms[:, 1] <= y) &
+                   (x + w <= rooms[:, 0] + rooms[:, 2]) & (y + h <= rooms[:, 1] + rooms[:, 3])).any()
+        if in_room:
+            return self._box_sum(self._furniture, rect) > 0
+        # the floor never reaches the border of the raster, beyond it everything is outside
+        on_raster = x >= self._origin[0] and y >= self._origin[1] and \
+            x + w <= self._origin[0] + self._outside.shape[1] - 1 and \
+            y + h <= self._origin[1] + self._outside.shape[0] - 1
+        return not on_raster or self._box_sum(self._outside, rect) > 0
+
+    def _box_sums(self, table, x, y, w, h):
+        height, width = table.shape[0] - 1, table.shape[1] - 1
+        top, bottom = np.clip(y - self._origin[1], 0, height), np.clip(y + h - self._origin[1], 0, height)
+        left, right = np.clip(x - self._origin[0], 0, width), np.clip(x + w - self._origin[0], 0, width)
+        return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+    def colliding(self, rects):
+        """is_colliding of every one of the (N, 4) integer rects, in one pass."""
+        x, y, w, h = np.asarray(rects, dtype=np.int64).reshape(-1, 4).T
+        rx, ry, rw, rh = (column[:, None] for column in self._room_rects.T)
+        in_room = ((rx <= x) & (ry <= y) & (x + w <= rx + rw) & (y + h <= ry + rh)).any(axis=0)
+        on_raster = (x >= self._origin[0]) & (y >= self._origin[1]) & \
+            (x + w <= self._origin[0] + self._outside.shape[1] - 1) & \
+            (y + h <= self._origin[1] + self._outside.shape[0] - 1)
+        return np.where(in_room, self._box_sums(self._furniture, x, y, w, h) > 0,
+                        ~on_raster | (self._box_sums(self._outside, x, y, w, h) > 0))
+
+    def _near_hits(self, rays, row, column):
+        """Closest exact hit of each ray among the segments listed for its cell."""
+        cells = row * self._shape[1] + column
+        starts = self._near_starts[cells]
+        counts = self._near_starts[cells + 1] - starts
+        ray_index = np.repeat(np.arange(len(rays)), counts)
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        segments = self._segments[self._near_items[offsets + np.arange(counts.sum())]]
+        distances = np.full(len(rays), np.inf)
+        np.minimum.at(distances, ray_index, geometry.backend().hit_distances(*rays[ray_index].T, *segments.T))
+        return distances
+
+    def trace(self, rays):
+        """Sphere traces the rays (R, 4): distance of the first hit, inf if none, nan if not resolved in max_steps."""
+        x1, y1 = rays[:, 0], rays[:, 1]
+        dx, dy = rays[:, 2] - x1, rays[:, 3] - y1
+        length = np.hypot(dx, dy)
+        dx, dy = dx / length, dy / length
+        t = np.zeros(len(rays))
+        result = np.full(len(rays), np.nan)
+        active = np.ones(len(rays), dtype=bool)
+        for _ in range(self._max_steps):
+            index = np.nonzero(active)[0]
+            if len(index) == 0:
+                break
+            xs, ys = x1[index] + t[index] * dx[index], y1[index] + t[index] * dy[index]
+            row, column, inside = self._cells(xs, ys)
+            distance = np.where(inside, np.abs(self.distance[row, column]), np.inf)
+            near = distance <= self.hit_tolerance
+            hit = np.zeros(len(index), dtype=bool)
+            if near.any():
+                hits = self._near_hits(rays[index[near]], row[near], column[near])
+                accepted = hits <= t[index[near]] + self._window
+                result[index[near][accepted]] = hits[accepted]
+                hit[np.nonzero(near)[0][accepted]] = True
+            t[index] += np.maximum(distance - self.error, self.error)
+            missed = ~hit & (t[index] > length[index])
+            result[index[missed]] = np.inf
+            active[index[hit | missed]] = False
+        return result
+
+
+class ObstacleHash:
+    """Spatial hash of the furniture bounding boxes of a map.
+
+    Every piece of furniture is registered in the cell_size buckets its box overlaps, a query only tests
+    the pieces of the buckets the queried rect overlaps. Pieces keep the room they belong to and their
+    depth: 0 for the children of a room, 1 for the objects standing on them."""
+
+    def __init__(self, room_rects, obstacles, cell_size=HASH_CELL_SIZE):
+        self.cell_size = cell_size
+        self.room_rects = list(room_rects)
+        # (x, y, width, height) as loaded and truncated like the pygame.Rect of the sprite
+        self.boxes = [tuple(obstacle[:4]) for obstacle in obstacles]
+        self.rects = [tuple(int(value) for value in obstacle[:4]) for obstacle in obstacles]
+        self.rooms = [obstacle[4] for obstacle in obstacles]
+        self.depths = [obstacle[5] for obstacle in obstacles]
+        # the same as arrays, for the batched queries
+        self._room_array = np.asarray(self.room_rects, dtype=np.int64).reshape(-1, 4)
+        self._rect_array = np.asarray(self.rects, dtype=np.int64).reshape(-1, 4)
+        self._piece_rooms = np.asarray(self.rooms, dtype=np.int64)
+        self._buckets = {}
+        for i, (x, y, w, h) in enumerate(self.boxes):
+            for key in self._keys(x, y, w, h):
+                self._buckets.setdefault(key, []).append(i)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _keys(self, x, y, w, h):
+        size = self.cell_size
+        for bx in range(int(x // size), int((x + w) // size) + 1):
+            for by in range(int(y // size), int((y + h) // size) + 1):
+                yield bx, by
+
+    def candidates(self, x, y, w, h):
+        """Indexes of the pieces sharing a bucket with the rect, each once, in load order."""
+        found = set()
+        for key in self._keys(x, y, w, h):
+            found.update(self._buckets.get(key, ()))
+        return sorted(found)
+
+    def rooms_containing(self, rect):
+        """Indexes of the rooms whose rect contains the integer rect, as pygame.Rect.contains."""
+        x, y, w, h = rect
+        return [i for i, (rx, ry, rw, rh) in enumerate(self.room_rects)
+                if rx <= x and ry <= y and x + w <= rx + rw and y + h <= ry + rh]
+
+    def collision(self, rect, rooms=None, depth=None):
+        """First piece overlapping the integer rect as pygame.Rect.colliderect, or None. Only the pieces of the
+        given rooms and at the given depth are considered when they are set."""
+        x, y, w, h = rect
+        if w <= 0 or h <= 0:
+            return None
+        for i in self.candidates(x, y, w, h):
+            if (rooms is not None and self.rooms[i] not in rooms) or (depth is not None and self.depths[i] != depth):
+                continue
+            cx, cy, cw, ch = self.rects[i]
+            if cw > 0 and ch > 0 and x < cx + cw and cx < x + w and y < cy + ch and cy < y + h:
+                return i
+        return None
+
+    def collisions(self, rects):
+        """Batched rooms_containing and collision(rect, rooms=rooms_containing(rect)) of (N, 4) integer rects.
+        Returns whether some room contains each rect and whether it overlaps a piece of one of those rooms."""
+        x, y, w, h = (rects[:, i, None] for i in range(4))
+        rx, ry, rw, rh = self._room_array.T
+        containing = (rx <= x) & (ry <= y) & (x + w <= rx + rw) & (y + h <= ry + rh)
+        cx, cy, cw, ch = self._rect_array.T
+        overlapping = (w > 0) & (h > 0) & (cw > 0) & (ch > 0) & (x < cx + cw) & (cx < x + w) & \
+            (y < cy + ch) & (cy < y + h)
+        overlapping &= containing[:, self._piece_rooms]
+        return containing.any(axis=1), overlapping.any(axis=1)
+
+
+class RoomRaster:
+    """Index of the room each integer point of the map falls in, as Training.room_sensor: the first room whose
+    rect strictly contains the point, -1 when none does. Points that are not integer are tested on the rects."""
+
+    def __init__(self, room_boxes):
+        self.boxes = np.asarray(room_boxes, dtype=np.float64).reshape(-1, 4)
+        if len(self.boxes) == 0:
+            self._origin, self.raster = (0, 0), np.full((0, 0), -1, dtype=np.int16)
+            return
+        x, y, w, h = self.boxes.T
+        self._origin = (math.floor(x.min()), math.floor(y.min()))
+        width = math.ceil((x + w).max()) - self._origin[0] + 1
+        height = math.ceil((y + h).max()) - self._origin[1] + 1
+        self.raster = np.full((height, width), -1, dtype=np.int16)
+        # painted backwards so that the first room wins where rooms overlap
+        for i in reversed(range(len(self.boxes))):
+            left, top = math.floor(x[i]) + 1 - self._origin[0], math.floor(y[i]) + 1 - self._origin[1]
+            right, bottom = math.ceil(x[i] + w[i]) - self._origin[0], math.ceil(y[i] + h[i]) - self._origin[1]
+            self.raster[top:bottom, left:right] = i
+
+    def room_at(self, x, y):
+        if x != int(x) or y != int(y):
+            return self._room_of_box(x, y)
+        column, row = int(x) - self._origin[0], int(y) - self._origin[1]
+        if 0 <= row < self.raster.shape[0] and 0 <= column < self.raster.shape[1]:
+            return int(self.raster[row, column])
+        return -1
+
+    def _room_of_box(self, x, y):
+        for i, (rx, ry, rw, rh) in enumerate(self.boxes):
+            if rx < x < rx + rw and ry < y < ry + rh:
+                return i
+        return -1
+
+    def rooms_at(self, xs, ys):
+        """Vectorized room_at of the points (xs, ys)."""
+        xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+        xs, ys = np.broadcast_arrays(xs, ys)
+        columns, rows = xs.astype(np.int64) - self._origin[0], ys.astype(np.int64) - self._origin[1]
+        inside = (0 <= rows) & (rows < self.raster.shape[0]) & (0 <= columns) & (columns < self.raster.shape[1])
+        rooms = np.full(xs.shape, -1, dtype=np.int64)
+        rooms[inside] = self.raster[rows[inside], columns[inside]]
+        fractional = (xs != np.trunc(xs)) | (ys != np.trunc(ys))
+        if fractional.any():
+            x, y = xs[fractional, None], ys[fractional, None]
+            rx, ry, rw, rh = self.boxes.T
+            within = (rx < x) & (x < rx + rw) & (ry < y) & (y < ry + rh)
+            rooms[fractional] = np.where(within.any(axis=1), within.argmax(axis=1), -1)
+        return rooms
+
+
+class FreeSpace:
+    """Integer spawn positions of a map that are free for a footprint, sampled without rejection.
+
+    Positions are drawn like the reset of the training loop: a room picked at random, then a point between
+    1.15 times its corner and 85% of its size. Agents must be free for colliding, the batched test ending an
+    episode (SegmentTable.colliding), so that no episode starts on a collision. Objectives must not overlap a
+    piece of furniture standing on the floor. A room is picked with probability proportional to its share of free
+    positions, so samples follow the distribution the retry loop converged to."""
+
+    def __init__(self, room_boxes, obstacles, colliding):
+        self.room_boxes = [tuple(box) for box in room_boxes]
+        self._colliding = colliding
+        # rects tested by colliding at once, its (rects, pieces) masks stay a few MB
+        self._chunk_size = max(2 ** 20 // max(len(obstacles), 1), 1)
+        floor_pieces = [i for i in range(len(obstacles)) if obstacles.depths[i] == 0]
+        self._rects = np.array([obstacles.rects[i] for i in floor_pieces], dtype=np.float64).reshape(-1, 4)
+        self._positions = {}
+        self._stacked = {}
+
+    @staticmethod
+    def _candidates(low, high):
+        low, high = min(low, high), max(low, high)
+        return np.arange(math.trunc(low), max(math.ceil(high), math.trunc(low) + 1), dtype=np.float64)
+
+    def _blocked(self, xs, ys, width, height, kind):
+        if kind == 'agent':
+            # the agent spawns facing up, its rect is not rotated
+            grid_x, grid_y = np.meshgrid(xs, ys, indexing='ij')
+            rects = np.stack([grid_x.ravel(), grid_y.ravel(), np.full(grid_x.size, width),
+                              np.full(grid_x.size, height)], axis=1).astype(np.int64)
+            blocked = np.concatenate([self._colliding(rects[start:start + self._chunk_size])
+                                      for start in range(0, len(rects), self._chunk_size)])
+            return blocked.reshape(grid_x.shape)
+        cx, cy, cw, ch = (column[:, None] for column in self._rects.T)
+        real = (cw > 0) & (ch > 0)
+        blocked_x = (xs < cx + cw) & (cx < xs + width) & real
+        blocked_y = (ys < cy + ch) & (cy < ys + height) & real
+        # a position is blocked when one piece blocks it along both axes
+        return (blocked_x.T.astype(np.float64) @ blocked_y.astype(np.float64)) > 0
+
+    def positions(self, width, height, kind):
+        """Free positions of every room having some, with the cumulative probability of picking each room."""
+        key = (width, height, kind)
+        if key not in self._positions:
+            positions, weights = [], []
+            for x, y, w, h in self.room_boxes:
+                xs, ys = self._candidates(x * 1.15, x + w * 0.85), self._candidates(y * 1.15, y + h * 0.85)
+                free_x, free_y = np.nonzero(~self._blocked(xs, ys, width, height, kind))
+                if len(free_x):
+                    positions.append(np.stack([xs[free_x], ys[free_y]], axis=1).astype(np.int64))
+                    weights.append(len(free_x) / (len(xs) * len(ys)))
+            total = sum(weights)
+            if not positions:
+                raise ValueError(f'no free position for a {width} x {height} {kind} on this map')
+            self._positions[key] = positions, np.cumsum(weights) / total
+        return self._positions[key]
+
+    def sample(self, width, height, kind, rng=random):
+        positions, cumulative = self.positions(width, height, kind)
+        room = min(int(np.searchsorted(cumulative, rng.random(), side='right')), len(positions) - 1)
+        x, y = positions[room][rng.randrange(len(positions[room]))]
+        return int(x), int(y)
+
+    def sample_agent(self, width, height, rng=random):
+        return self.sample(width, height, 'agent', rng)
+
+    def sample_objective(self, width, height, rng=random):
+        return self.sample(width, height, 'objective', rng)
+
+    def sample_many(self, width, height, kind, number, rng):
+        """number positions drawn like sample, all at once from the NumPy Generator rng, as an (number, 2) array."""
+        key = (width, height, kind)
+        positions, cumulative = self.positions(width, height, kind)
+        if key not in self._stacked:
+            counts = np.array([len(room_positions) for room_positions in positions])
+            self._stacked[key] = np.concatenate(positions), np.cumsum(counts) - counts, counts
+        stacked, starts, counts = self._stacked[key]
+        rooms = np.minimum(np.searchsorted(cumulative, rng.random(number), side='right'), len(positions) - 1)
+        return stacked[starts[rooms] + rng.integers(0, counts[rooms])]
+
+
+class DoorIndex:
+    """Centres of the doors of a map hashed in cell_size buckets, for the proximity queries of the logic driver."""
+
+    def __init__(self, doors, cell_size=HASH_CELL_SIZE):
+        self.cell_size = cell_size
+        self.doors = list(doors)
+        self.centres = [(door.x + door.width / 2, door.y + door.height / 2) for door in self.doors]
+        self._buckets = {}
+        for i, (x, y) in enumerate(self.centres):
+            self._buckets.setdefault((int(x // cell_size), int(y // cell_size)), []).append(i)
+
+    def __len__(self):
+        return len(self.doors)
+
+    def in_front(self, x, y, ths_w, ths_d):
+        """First door, in load order, whose centre is within ths_d of the point along one axis and within ths_w
+        along the other, or None."""
+        size, reach = self.cell_size, max(ths_w, ths_d)
+        found = []
+        for bx in range(int((x - reach) // size), int((x + reach) // size) + 1):
+            for by in range(int((y - reach) // size), int((y + reach) // size) + 1):
+                found.extend(self._buckets.get((bx, by), ()))
+        for i in sorted(found):
+            dx, dy = abs(x - self.centres[i][0]), abs(y - self.centres[i][1])
+            if (dx < ths_d and dy < ths_w) or (dy < ths_d and dx < ths_w):
+                return self.doors[i]
+        return None
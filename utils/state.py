@@ -0,0 +1,157 @@
+import math
+
+import numpy as np
+
+# displacement of a forward step for every heading, as Training.update_agent_pos_by_action
+MOVES = {0: (1, 0), 45: (1, -1), 90: (0, -1), 135: (-1, -1), 180: (-1, 0), 225: (-1, 1), 270: (0, 1), 315: (1, 1)}
+# the same indexed by heading // 45
+MOVE_X = np.array([MOVES[rot][0] for rot in range(0, 360, 45)])
+MOVE_Y = np.array([MOVES[rot][1] for rot in range(0, 360, 45)])
+AGENT_SIZE = (8, 8)
+OBJECTIVE_SIZE = (15, 15)
+
+
+def rotated_size(width, height, angle):
+    """Size of a width x height surface once rotated by angle degrees, computed as pygame.transform.rotate does."""
+    if math.fmod(angle, 90) == 0:
+        return (width, height) if (angle // 90) % 2 == 0 else (height, width)
+    radians = angle * .01745329251994329
+    sine, cosine = math.sin(radians), math.cos(radians)
+    cx, cy, sx, sy = cosine * width, cosine * height, sine * width, sine * height
+    return int(max(abs(cx + sy), abs(cx - sy))), int(max(abs(sx + cy), abs(sx - cy)))
+
+
+class WorldState:
+    """Dynamic part of a world: agent pose, objective and episode counters, one array per field so that N states
+    sharing a map can be stepped at once. The map is not part of the state, a snapshot copies a few numbers."""
+    FIELDS = dict(agent_x=np.float64, agent_y=np.float64, rot=np.int64, last_room=np.int64,
+                  objective_x=np.float64, objective_y=np.float64, frame_count=np.int64, frame_since_cross=np.int64,
+                  score=np.int64, dist_to_objective=np.float64)
+
+    def __init__(self, size=1, **values):
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(size, dtype=dtype))
+        for name, value in values.items():
+            getattr(self, name)[:] = value
+
+    def __len__(self):
+        return len(self.agent_x)
+
+    def copy(self):
+        return self.take(slice(None))
+
+    def take(self, index):
+        """The states selected by index (a slice, an index array or a mask), as a new WorldState."""
+        state = WorldState(0)
+        for name in self.FIELDS:
+            setattr(state, name, np.atleast_1d(getattr(self, name)[index]).copy())
+        return state
+
+    def repeat(self, count):
+        """Every state repeated count times in a row, e.g. to try count actions from the same state."""
+        state = WorldState(0)
+        for name in self.FIELDS:
+            setattr(state, name, np.repeat(getattr(self, name), count))
+        return state
+
+    def put(self, index, other):
+        """Writes the states of other, in place, over the states selected by index."""
+        for name in self.FIELDS:
+            getattr(self, name)[index] = getattr(other, name)
+
+    def restore(self, other):
+        """Overwrites this state, in place, with other."""
+        for name in self.FIELDS:
+            getattr(self, name)[:] = getattr(other, name)
+
+    def agent_rects(self, agent_size=AGENT_SIZE):
+        # the rect draw_agent_and_target gives the sprite: the rotated image placed on the agent position
+        rots, inverse = np.unique(self.rot, return_inverse=True)
+        sizes = np.array([rotated_size(*agent_size, rot - 90) for rot in rots.tolist()], dtype=np.int64)
+        rects = np.empty((len(self), 4), dtype=np.int64)
+        rects[:, 0], rects[:, 1] = self.agent_x.astype(np.int64), self.agent_y.astype(np.int64)
+        rects[:, 2:] = sizes.reshape(-1, 2)[inverse.reshape(-1)]
+        return rects
+
+    def objective_rects(self, objective_size=OBJECTIVE_SIZE):
+        rects = np.empty((len(self), 4), dtype=np.int64)
+        rects[:, 0], rects[:, 1] = self.objective_x.astype(np.int64), self.objective_y.astype(np.int64)
+        rects[:, 2:] = objective_size
+        return rects
+
+
+def observe(state, table, sensor, agent_size=AGENT_SIZE, objective_size=OBJECTIVE_SIZE, static_sources=()):
+    """The (N, output_rays, 3) observations of every state and whether its agent looks at the objective.
+    static_sources, e.g. World.static_sources(), are asked for the static distances before casting them."""
+    return _project(state, state.agent_rects(agent_size), state.objective_rects(objective_size), table, sensor,
+                    static_sources)
+
+
+def _project(state, agent_rects, objective_rects, table, sensor, static_sources):
+    # the sensor sits in the center of the agent rect
+    eye_points = agent_rects[:, :2] + agent_rects[:, 2:] // 2
+    return sensor.project_many(eye_points, state.rot, table, objective_rects, static_sources)
+
+
+def step(state, actions, table, sensor, speed=2, max_frames=None, agent_size=AGENT_SIZE,
+         objective_size=OBJECTIVE_SIZE, static_sources=()):
+    """One frame of every state for its action (0 left, 1 right, 2 forward), without touching state.
+
+    Rewards follow Training.make_reward. An objective reached is counted in the score but stays where it is,
+    moving it is left to the caller. Returns the next state, the (N, output_rays, 3) observations, the rewards and
+    the terminal flags: a collision with the world, or more than max_frames frames when it is given."""
+    actions = np.broadcast_to(np.asarray(actions), (len(state),))
+    next_state = state.copy()
+    next_state.rot = (state.rot + np.where(actions == 0, 45, np.where(actions == 1, -45, 0))) % 360
+    dx, dy = MOVE_X[state.rot // 45], MOVE_Y[state.rot // 45]
+    forward = actions == 2
+    next_state.agent_x = state.agent_x + np.where(forward, dx * speed, 0)
+    next_state.agent_y = state.agent_y + np.where(forward, dy * speed, 0)
+    next_state.last_room = table.rooms.rooms_at(next_state.agent_x, next_state.agent_y)
+    room_changed = next_state.last_room != state.last_room
+    next_state.frame_count = state.frame_count + 1
+    next_state.frame_since_cross = np.where(room_changed, 0, state.frame_since_cross + 1)
+
+    agent_rects = next_state.agent_rects(agent_size)
+    objective_rects = next_state.objective_rects(objective_size)
+    observations, looking = _project(next_state, agent_rects, objective_rects, table, sensor, static_sources)
+
+    rewards = np.where(looking, 3, 0)
+    distances = np.sqrt((next_state.agent_x - next_state.objective_x) ** 2 +
+                        (next_state.agent_y - next_state.objective_y) ** 2)
+    closer = looking & (distances < state.dist_to_objective)
+    rewards += np.where(closer, 5, 0)
+    next_state.dist_to_objective = np.where(closer, distances, state.dist_to_objective)
+    ax, ay, aw, ah = agent_rects.T
+    ox, oy, ow, oh = objective_rects.T
+    reached = (ax < ox + ow) & (ox < ax + aw) & (ay < oy + oh) & (oy < ay + ah)
+    rewards += np.where(reached, 10, 0)
+    next_state.score = state.score + reached
+    rewards += room_changed
+
+    terminals = table.colliding(agent_rects)
+    if max_frames is not None:
+        terminals |= next_state.frame_count > max_frames
+    return next_state, observations, rewards, terminals
+
+
+def rollout(state, action_sequence, table, sensor, **kwargs):
+    """k step lookahead: plays action_sequence (k actions, or k arrays of one action per state) from state.
+    Returns the last state, the rewards summed until each state ended and whether it did."""
+    total = np.zeros(len(state))
+    ended = np.zeros(len(state), dtype=bool)
+    for actions in action_sequence:
+        next_state, _, rewards, terminals = step(state, actions, table, sensor, **kwargs)
+        total += np.where(ended, 0, rewards)
+        # ended states do not move any more
+        next_state.restore(_where(ended, state, next_state))
+        ended |= terminals
+        state = next_state
+    return state, total, ended
+
+
+def _where(mask, if_true, if_false):
+    state = WorldState(0)
+    for name in WorldState.FIELDS:
+        setattr(state, name, np.where(mask, getattr(if_true, name), getattr(if_false, name)))
+    return state
@@ -63,20 +63,33 @@ def check_line_line_collision(line1, line2):
     y3 = line2[1]
     x4 = line2[2]
     y4 = line2[3]
-    try:
-        uA = ((x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)) / ((y4 - y3) * (x2 - x1) - (x4 - x3) * (y2 - y1))
-    except ZeroDivisionError:
-        uA = 2
-    try:
-        uB = ((x2 - x1) * (y1 - y3) - (y2 - y1) * (x1 - x3)) / ((y4 - y3) * (x2 - x1) - (x4 - x3) * (y2 - y1))
-    except ZeroDivisionError:
-        uB = 2
+    denominator = (y4 - y3) * (x2 - x1) - (x4 - x3) * (y2 - y1)
+    if denominator == 0:
+        # parallel or degenerate segments
+        return None
+    uA = ((x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)) / denominator
+    uB = ((x2 - x1) * (y1 - y3) - (y2 - y1) * (x1 - x3)) / denominator
     if 0 <= uA <= 1 and 0 <= uB <= 1:
         return int(x1 + (uA * (x2 - x1))), int(y1 + (uA * (y2 - y1)))
     else:
         return None
 
 
+def check_lines_collision(x1, y1, x2, y2, x3, y3, x4, y4):
+    """Element-wise check_line_line_collision, returns the truncated intersection coordinates and the hit mask."""
+    # same operations as the scalar version, shared terms are computed once
+    dx1, dy1, dx2, dy2 = x2 - x1, y2 - y1, x4 - x3, y4 - y3
+    ox, oy = x1 - x3, y1 - y3
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = dy2 * dx1 - dx2 * dy1
+        u_a = (dx2 * oy - dy2 * ox) / denominator
+        u_b = (dx1 * oy - dy1 * ox) / denominator
+        hit = (0 <= u_a) & (u_a <= 1) & (0 <= u_b) & (u_b <= 1)
+        px = np.trunc(x1 + (u_a * dx1))
+        py = np.trunc(y1 + (u_a * dy1))
+    return px, py, hit
+
+
 class Check_Collisions:
     def __init__(self):
         pass
@@ -0,0 +1,141 @@
+from utils.utils import Agent, Game_Object
+from utils.sensor import RaySensor, ScanCache, StaticObservationTable, compile_map
+
+
+class WorldField:
+    """Attribute of an object sharing a World, read from and written to the World it uses."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __get__(self, owner, owner_type=None):
+        if owner is None:
+            return self
+        return getattr(owner._world, self._name)
+
+    def __set__(self, owner, value):
+        setattr(owner._world, self._name, value)
+
+
+class World:
+    """Everything living as long as one map: its geometry, the indexes compiled from it, the dynamic entities and
+    the caches built on top of them.
+
+    Training and Environment share one World instead of copying its fields into each other. reset() is the cheap
+    per episode reset, teardown() drops the map and everything derived from it before the next one is loaded."""
+
+    def __init__(self, multiplier, field_resolution=None):
+        self.multiplier = multiplier
+        # pixels per cell of the distance field compiled with the map, None to skip it
+        self.field_resolution = field_resolution
+        self.agent = Agent(9999, 9999, 8, 8, 0, 'agent', 90)
+        self.objective = Game_Object(9800, 9800, 15, 15, 0, 'objective')
+        self.screen = None
+        self.sensor = RaySensor()
+        self.version = 0
+        self._static_lookup_directory = None
+        self._static_lookup = None
+        self._scan_cache_capacity = None
+        self._scan_cache = None
+        self._observation_key = None
+        self._observation = None
+        self.rooms = []
+        self.floor = Game_Object(0, 0, 0, 0, 0, 'floor')
+        self.doors = []
+        self.segments = None
+
+    def compile(self):
+        """Compiles the rooms and the floor into the segment table and the indexes of the map."""
+        self.segments = compile_map(self.rooms, self.floor, self.multiplier, field_resolution=self.field_resolution)
+        self.invalidate()
+
+    def reset(self):
+        # the map and its caches are kept, only what depends on the dynamic entities is dropped
+        self.invalidate()
+
+    def teardown(self):
+        if self._static_lookup is not None:
+            self._static_lookup.close()
+        self._static_lookup = None
+        self._scan_cache = None
+        self.rooms = []
+        self.floor = Game_Object(0, 0, 0, 0, 0, 'floor')
+        self.doors = []
+        self.segments = None
+        self.invalidate()
+
+    def invalidate(self):
+        self.version += 1
+        self._observation_key = None
+        self._observation = None
+
+    def use_sensor(self, sensor):
+        # the lookup table and the scan cache hold the rays of the previous sensor
+        if self._static_lookup is not None:
+            self._static_lookup.close()
+        self.sensor = sensor
+        self._static_lookup = None
+        self._scan_cache = None
+        self.invalidate()
+
+    def use_static_lookup(self, directory):
+        self._static_lookup_directory = directory
+        self.invalidate()
+
+    def static_lookup(self):
+        if self._static_lookup_directory is None or self.segments is None:
+            return None
+        if self._static_lookup is None or self._static_lookup.table is not self.segments:
+            if self._static_lookup is not None:
+                self._static_lookup.close()
+            self._static_lookup = StaticObservationTable(self._static_lookup_directory, self.segments, self.sensor)
+        return self._static_lookup
+
+    def use_scan_cache(self, capacity):
+        self._scan_cache_capacity = capacity
+        self.invalidate()
+
+    def scan_cache(self):
+        if self._scan_cache_capacity is None or self.segments is None:
+            return None
+        if self._scan_cache is None or self._scan_cache.table is not self.segments:
+            self._scan_cache = ScanCache(self.segments, self.sensor, self._scan_cache_capacity)
+        return self._scan_cache
+
+    def static_sources(self):
+        # where the static part of an observation is looked up before casting it, in order
+        return [source for source in (self.static_lookup(), self.scan_cache()) if source is not None]
+
+    def static_distances(self):
+        # static part of the observation from the lookup table or the scan cache, None to cast it
+        eye_point, rot = self.agent.sprite.rect.center, self.agent._target_rot
+        for source in self.static_sources():
+            static_distances = source.static_distances(eye_point, rot)
+            if static_distances is not None:
+                return static_distances
+        return None
+
+    def observe(self):
+        # one observation per frame: the result is shared by every caller until the agent, the objective or
+        # the world change, so it must be treated as read-only
+        if self.segments is None:
+            self.compile()
+        key = (self.agent.sprite.rect.center, self.agent._target_rot, tuple(self.objective.sprite.rect),
+               id(self.segments), self.version)
+        if key != self._observation_key:
+            points, is_agent_looking_at_objective = self.sensor.project(self.agent.sprite.rect.center,
+                                                                        self.agent._target_rot, self.segments,
+                                                                        self.objective.sprite.rect,
+                                                                        self.static_distances())
+            self._observation = points.copy(), is_agent_looking_at_objective
+            self._observation_key = key
+        return self._observation
+
+    def observe_poses(self, eye_points, rots, objective_rects=None):
+        # observations of N hypothetical agent poses (eye points and headings) against the loaded map, without
+        # moving the agent; the objective defaults to the current one for every pose
+        if self.segments is None:
+            self.compile()
+        if objective_rects is None:
+            objective_rects = tuple(self.objective.sprite.rect)
+        return self.sensor.project_many(eye_points, rots, self.segments, objective_rects)